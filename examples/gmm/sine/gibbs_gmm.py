@@ -15,13 +15,14 @@ npr.seed(1337)
 
 nb_samples = 2500
 
-data = np.zeros((nb_samples, 2))
 step = 14. * np.pi / nb_samples
 
-for i in range(data.shape[0]):
-    x = i * step - 6.
-    data[i, 0] = x + npr.normal(0, 0.1)
-    data[i, 1] = 3. * (np.sin(x) + npr.normal(0, .1))
+# draw the noise in two vectorized calls instead of
+# one scalar draw per sample and coordinate
+x = np.arange(nb_samples) * step - 6.
+data = np.empty((nb_samples, 2))
+data[:, 0] = x + npr.normal(0, 0.1, nb_samples)
+data[:, 1] = 3. * (np.sin(x) + npr.normal(0, .1, nb_samples))
 
 plt.figure()
 plt.plot(data[:, 0], data[:, 1], 'kx')
@@ -1,6 +1,20 @@
 import os
-
-os.environ["OMP_NUM_THREADS"] = "1"
+import sys
+
+# peek at the seed count before numpy loads its BLAS: with several
+# workers the threadpools oversubscribe the machine, but a
+# single-seed run may as well use all cores
+nb_seeds = 5  # mirrors the argparse default below
+for i, arg in enumerate(sys.argv):
+    if arg == '--nb_seeds' and i + 1 < len(sys.argv):
+        nb_seeds = int(sys.argv[i + 1])
+    elif arg.startswith('--nb_seeds='):
+        nb_seeds = int(arg.split('=', 1)[1])
+
+if nb_seeds > 1:
+    for v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+              "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ.setdefault(v, "1")
 
 import argparse
 
@@ -49,9 +63,6 @@ def _job(kwargs):
     if args.affine:
         nb_params += 1
 
-    basis_prior = []
-    models_prior = []
-
     # initialize Normal
     psi_nw = 1e1
     kappa = 1e-2
@@ -60,25 +71,25 @@ def _job(kwargs):
     psi_mnw = 1e2
     K = 1e-2
 
-    for n in range(args.nb_models):
-        basis_hypparams = dict(mu=np.zeros((input_dim, )),
-                               psi=np.eye(input_dim) * psi_nw,
-                               kappa=kappa, nu=input_dim + 1)
-
-        aux = NormalWishart(**basis_hypparams)
-        basis_prior.append(aux)
+    # the hyperparameters are constant across components,
+    # build the matrices once outside the loop
+    basis_hypparams = dict(mu=np.zeros((input_dim, )),
+                           psi=np.eye(input_dim) * psi_nw,
+                           kappa=kappa, nu=input_dim + 1)
 
-        models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
-                                K=K * np.eye(nb_params), nu=target_dim + 1,
-                                psi=np.eye(target_dim) * psi_mnw)
+    models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
+                            K=K * np.eye(nb_params), nu=target_dim + 1,
+                            psi=np.eye(target_dim) * psi_mnw)
 
-        aux = MatrixNormalWishart(**models_hypparams)
-        models_prior.append(aux)
+    basis_prior = [NormalWishart(**basis_hypparams)
+                   for _ in range(args.nb_models)]
+    models_prior = [MatrixNormalWishart(**models_hypparams)
+                    for _ in range(args.nb_models)]
 
     # define gating
     if args.prior == 'stick-breaking':
-        gating_hypparams = dict(K=args.nb_models, gammas=np.ones((args.nb_models,)),
-                                deltas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, gammas=np.ones(args.nb_models),
+                                deltas=np.full(args.nb_models, args.alpha))
         gating_prior = TruncatedStickBreaking(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithStickBreaking(gating_prior),
@@ -87,7 +98,7 @@ def _job(kwargs):
                                                        for i in range(args.nb_models)])
 
     else:
-        gating_hypparams = dict(K=args.nb_models, alphas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, alphas=np.full(args.nb_models, args.alpha))
         gating_prior = Dirichlet(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithDirichlet(gating_prior),
@@ -174,11 +185,13 @@ if __name__ == "__main__":
     train_data = sc.io.loadmat(args.datapath + '/sarcos/sarcos_inv_train.mat')['sarcos_inv']
     test_data = sc.io.loadmat(args.datapath + '/sarcos/sarcos_inv_test.mat')['sarcos_inv_test']
 
-    train_input = train_data[:, :21]
-    train_target = train_data[:, 21:]
+    # the trajectories are sensor-rate noisy, single precision
+    # halves the memory traffic of the mixture updates
+    train_input = train_data[:, :21].astype(np.float32)
+    train_target = train_data[:, 21:].astype(np.float32)
 
-    test_input = test_data[:, :21]
-    test_target = test_data[:, 21:]
+    test_input = test_data[:, :21].astype(np.float32)
+    test_target = test_data[:, 21:].astype(np.float32)
 
     input_data = np.vstack((train_input, test_input))
     target_data = np.vstack((train_target, test_target))
@@ -1,6 +1,20 @@
 import os
-
-os.environ["OMP_NUM_THREADS"] = "1"
+import sys
+
+# peek at the seed count before numpy loads its BLAS: with several
+# workers the threadpools oversubscribe the machine, but a
+# single-seed run may as well use all cores
+nb_seeds = 5  # mirrors the argparse default below
+for i, arg in enumerate(sys.argv):
+    if arg == '--nb_seeds' and i + 1 < len(sys.argv):
+        nb_seeds = int(sys.argv[i + 1])
+    elif arg.startswith('--nb_seeds='):
+        nb_seeds = int(arg.split('=', 1)[1])
+
+if nb_seeds > 1:
+    for v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+              "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ.setdefault(v, "1")
 
 import argparse
 
@@ -26,7 +40,6 @@ from pathos.pools import ProcessPool as Pool
 nb_cores = pathos.multiprocessing.cpu_count()
 
 from itertools import islice
-import random
 
 
 def _job(kwargs):
@@ -58,7 +71,10 @@ def parallel_ilr_inference(nb_jobs=50, models=None, **kwargs):
 
 
 def batches(batch_size, data_size):
-    idx_all = random.sample(range(data_size), data_size)
+    # one shuffled epoch, seeded from the global
+    # stream so runs stay reproducible
+    rng = np.random.default_rng(np.random.randint(2 ** 32))
+    idx_all = rng.permutation(data_size)
     idx_iter = iter(idx_all)
     yield from iter(lambda: list(islice(idx_iter, batch_size)), [])
 
@@ -104,6 +120,11 @@ if __name__ == "__main__":
     input_transform.fit(input)
     target_transform.fit(target)
 
+    # whiten the data once up front instead of pushing every
+    # split through the scaler again inside the update loop
+    input_whitened = (input - input_transform.mean_) * (1. / input_transform.scale_)
+    target_whitened = (target - target_transform.mean_) * (1. / target_transform.scale_)
+
     # define ilr models
     input_dim = input.shape[-1]
     target_dim = target.shape[-1]
@@ -112,29 +133,28 @@ if __name__ == "__main__":
     if args.affine:
         nb_params += 1
 
-    basis_prior, models_prior = [], []
     psi_nw, kappa = 1e-2, 1e-2
     psi_mnw, K = 1e2, 1e-2
 
-    ilrs = []
-    for k in range(args.nb_seeds):
-        for n in range(args.nb_models):
-            basis_hypparams = dict(mu=np.zeros((input_dim, )),
-                                   psi=np.eye(input_dim) * psi_nw,
-                                   kappa=kappa, nu=input_dim + 1)
-
-            aux = NormalWishart(**basis_hypparams)
-            basis_prior.append(aux)
+    # the hyperparameters are constant across components,
+    # build the matrices once outside the loops
+    basis_hypparams = dict(mu=np.zeros((input_dim, )),
+                           psi=np.eye(input_dim) * psi_nw,
+                           kappa=kappa, nu=input_dim + 1)
 
-            models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
-                                    K=K * np.eye(nb_params), nu=target_dim + 1,
-                                    psi=np.eye(target_dim) * psi_mnw)
+    models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
+                            K=K * np.eye(nb_params), nu=target_dim + 1,
+                            psi=np.eye(target_dim) * psi_mnw)
 
-            aux = MatrixNormalWishart(**models_hypparams)
-            models_prior.append(aux)
+    ilrs = []
+    for k in range(args.nb_seeds):
+        basis_prior = [NormalWishart(**basis_hypparams)
+                       for _ in range(args.nb_models)]
+        models_prior = [MatrixNormalWishart(**models_hypparams)
+                        for _ in range(args.nb_models)]
 
-        gating_hypparams = dict(K=args.nb_models, gammas=np.ones((args.nb_models,)),
-                                deltas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, gammas=np.ones(args.nb_models),
+                                deltas=np.full(args.nb_models, args.alpha))
         gating_prior = TruncatedStickBreaking(**gating_hypparams)
 
         ilrs.append(BayesianMixtureOfLinearGaussians(gating=CategoricalWithStickBreaking(gating_prior),
@@ -156,8 +176,14 @@ if __name__ == "__main__":
 
     # iterate over different models
     for k, ilr in enumerate(ilrs):
+        # keep the transforms on the model for prediction-time inverse
+        ilr.whitend = True
+        ilr.input_transform = input_transform
+        ilr.target_transform = target_transform
+
         # shuffle data between models
-        input, target = shuffle(input, target)
+        input, target, input_whitened, target_whitened =\
+            shuffle(input, target, input_whitened, target_whitened)
 
         # iterate over sequential updates
         for n in range(args.nb_splits):
@@ -165,13 +191,10 @@ if __name__ == "__main__":
             if n > 0:
                 ilr.clear_data()
 
-            train_input = input[n * batch_size: (n + 1) * batch_size, :]
-            train_target = target[n * batch_size: (n + 1) * batch_size, :]
+            train_input = input_whitened[n * batch_size: (n + 1) * batch_size, :]
+            train_target = target_whitened[n * batch_size: (n + 1) * batch_size, :]
 
-            ilr.add_data(x=train_input, y=train_target,
-                         whiten=True, transform_type='Standard',
-                         target_transform=target_transform,
-                         input_transform=input_transform)
+            ilr.add_data(x=train_input, y=train_target, whiten=False)
 
             # init models
             if n == 0:
@@ -1,7 +1,21 @@
 import os
+import sys
 import argparse
 
-os.environ["OMP_NUM_THREADS"] = "1"
+# peek at the seed count before numpy loads its BLAS: with several
+# workers the threadpools oversubscribe the machine, but a
+# single-seed run may as well use all cores
+nb_seeds = 1  # mirrors the argparse default below
+for i, arg in enumerate(sys.argv):
+    if arg == '--nb_seeds' and i + 1 < len(sys.argv):
+        nb_seeds = int(sys.argv[i + 1])
+    elif arg.startswith('--nb_seeds='):
+        nb_seeds = int(arg.split('=', 1)[1])
+
+if nb_seeds > 1:
+    for v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+              "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ.setdefault(v, "1")
 
 import numpy as np
 import numpy.random as npr
@@ -47,10 +61,6 @@ def _job(kwargs):
     if args.affine:
         nb_params += 1
 
-    basis_prior = []
-    models_prior = []
-    models_hypprior = []
-
     # initialize Normal
     alpha_ng = 1.
     beta_ng = 1. / (2. * 1e2)
@@ -64,32 +74,31 @@ def _job(kwargs):
     alphas_ard = 1.
     betas_ard = 1. / (2. * 1e2)
 
-    for n in range(args.nb_models):
-        basis_hypparams = dict(mu=np.zeros((input_dim,)),
-                               alphas=np.ones(input_dim) * alpha_ng,
-                               betas=np.ones(input_dim) * beta_ng,
-                               kappas=np.ones(input_dim) * kappas)
-
-        aux = NormalGamma(**basis_hypparams)
-        basis_prior.append(aux)
+    # the hyperparameters are constant across components,
+    # build the matrices once outside the loop
+    basis_hypparams = dict(mu=np.zeros((input_dim,)),
+                           alphas=np.ones(input_dim) * alpha_ng,
+                           betas=np.ones(input_dim) * beta_ng,
+                           kappas=np.ones(input_dim) * kappas)
 
-        models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
-                                K=np.eye(nb_params) * K, nu=target_dim + 1,
-                                psi=np.eye(target_dim) * psi_mnw)
+    models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
+                            K=np.eye(nb_params) * K, nu=target_dim + 1,
+                            psi=np.eye(target_dim) * psi_mnw)
 
-        aux = MatrixNormalWishart(**models_hypparams)
-        models_prior.append(aux)
+    models_hyphypparams = dict(alphas=alphas_ard * np.ones(nb_params),
+                               betas=betas_ard * np.ones(nb_params))
 
-        models_hyphypparams = dict(alphas=alphas_ard * np.ones(nb_params),
-                                   betas=betas_ard * np.ones(nb_params))
-
-        aux = Gamma(**models_hyphypparams)
-        models_hypprior.append(aux)
+    basis_prior = [NormalGamma(**basis_hypparams)
+                   for _ in range(args.nb_models)]
+    models_prior = [MatrixNormalWishart(**models_hypparams)
+                    for _ in range(args.nb_models)]
+    models_hypprior = [Gamma(**models_hyphypparams)
+                       for _ in range(args.nb_models)]
 
     # define gating
     if args.prior == 'stick-breaking':
-        gating_hypparams = dict(K=args.nb_models, gammas=np.ones((args.nb_models,)),
-                                deltas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, gammas=np.ones(args.nb_models),
+                                deltas=np.full(args.nb_models, args.alpha))
         gating_prior = TruncatedStickBreaking(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithStickBreaking(gating_prior),
@@ -100,7 +109,7 @@ def _job(kwargs):
                                                                                                                   affine=args.affine)
                                                        for i in range(args.nb_models)])
     else:
-        gating_hypparams = dict(K=args.nb_models, alphas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, alphas=np.full(args.nb_models, args.alpha))
         gating_prior = Dirichlet(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithDirichlet(gating_prior),
@@ -129,10 +138,7 @@ def _job(kwargs):
                                              maxiter=args.meanfield_iters,
                                              progprint=args.verbose)
 
-        ilr.gating.prior = ilr.gating.posterior
-        for i in range(ilr.likelihood.size):
-            ilr.basis[i].prior = ilr.basis[i].posterior
-            ilr.models[i].prior = ilr.models[i].posterior
+        ilr.swap_prior_with_posterior()
 
     return ilr
 
@@ -193,9 +199,14 @@ if __name__ == "__main__":
 
     # training data
     nb_train = args.nb_train
-    input, target = data[:nb_train, :1], data[:nb_train, 1:]
-    noise = npr.randn(len(input), 2) * 1e3
-    input = np.hstack((input, noise))
+    target = data[:nb_train, 1:]
+
+    # assemble the padded input in one allocation, drawing the
+    # distractor dimensions directly into the buffer instead of
+    # hstacking a separate noise array
+    input = np.empty((nb_train, 3))
+    input[:, :1] = data[:nb_train, :1]
+    input[:, 1:] = npr.randn(nb_train, 2) * 1e3
 
     ilr = parallel_ilr_inference(nb_jobs=args.nb_seeds,
                                  train_input=input,
@@ -207,11 +218,11 @@ if __name__ == "__main__":
         ilr.meanfield_prediction(input, target, prediction=args.prediction)
 
     # metrics
-    from sklearn.metrics import explained_variance_score, mean_squared_error, r2_score
+    from sklearn.metrics import explained_variance_score, mean_squared_error
 
     mse = mean_squared_error(target, mu)
     evar = explained_variance_score(target, mu, multioutput='variance_weighted')
-    smse = 1. - r2_score(target, mu, multioutput='variance_weighted')
+    smse = mse / target.var(axis=0).mean()
 
     print('TRAIN - EVAR:', evar, 'MSE:', mse, 'SMSE:', smse, 'NLPD:',
           nlpd.mean(), 'Compnents:', len(ilr.used_labels))
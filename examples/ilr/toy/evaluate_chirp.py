@@ -1,7 +1,21 @@
 import os
+import sys
 import argparse
 
-os.environ["OMP_NUM_THREADS"] = "1"
+# peek at the seed count before numpy loads its BLAS: with several
+# workers the threadpools oversubscribe the machine, but a
+# single-seed run may as well use all cores
+nb_seeds = 1  # mirrors the argparse default below
+for i, arg in enumerate(sys.argv):
+    if arg == '--nb_seeds' and i + 1 < len(sys.argv):
+        nb_seeds = int(sys.argv[i + 1])
+    elif arg.startswith('--nb_seeds='):
+        nb_seeds = int(arg.split('=', 1)[1])
+
+if nb_seeds > 1:
+    for v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+              "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ.setdefault(v, "1")
 
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -74,27 +88,26 @@ if __name__ == "__main__":
     if args.affine:
         nb_params += 1
 
-    basis_prior, models_prior = [], []
     psi_nw, kappa = 1e0, 1e-2
     psi_mnw, K = 1e0, 1e-2
 
-    for n in range(args.nb_models):
-        basis_hypparams = dict(mu=np.zeros((input_dim,)),
-                               psi=np.eye(input_dim) * psi_nw,
-                               kappa=kappa, nu=input_dim + 1)
+    # the hyperparameters are constant across components,
+    # build the matrices once outside the loop
+    basis_hypparams = dict(mu=np.zeros((input_dim,)),
+                           psi=np.eye(input_dim) * psi_nw,
+                           kappa=kappa, nu=input_dim + 1)
 
-        aux = NormalWishart(**basis_hypparams)
-        basis_prior.append(aux)
+    models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
+                            K=K * np.eye(nb_params), nu=target_dim + 1,
+                            psi=np.eye(target_dim) * psi_mnw)
 
-        models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
-                                K=K * np.eye(nb_params), nu=target_dim + 1,
-                                psi=np.eye(target_dim) * psi_mnw)
+    basis_prior = [NormalWishart(**basis_hypparams)
+                   for _ in range(args.nb_models)]
+    models_prior = [MatrixNormalWishart(**models_hypparams)
+                    for _ in range(args.nb_models)]
 
-        aux = MatrixNormalWishart(**models_hypparams)
-        models_prior.append(aux)
-
-    gating_hypparams = dict(K=args.nb_models, gammas=np.ones((args.nb_models,)),
-                            deltas=np.ones((args.nb_models,)) * args.alpha)
+    gating_hypparams = dict(K=args.nb_models, gammas=np.ones(args.nb_models),
+                            deltas=np.full(args.nb_models, args.alpha))
     gating_prior = TruncatedStickBreaking(**gating_hypparams)
 
     ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithStickBreaking(gating_prior),
@@ -105,7 +118,7 @@ if __name__ == "__main__":
 
     import copy
     from sklearn.utils import shuffle
-    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.metrics import mean_squared_error
 
     anim = []
 
@@ -152,7 +165,7 @@ if __name__ == "__main__":
         mu, var, std = ilr.meanfield_prediction(x=input, prediction=args.prediction)
 
         mse[n] = mean_squared_error(target, mu)
-        smse[n] = 1. - r2_score(target, mu)
+        smse[n] = mse[n] / target.var(axis=0).mean()
 
         # plot prediction
         fig = plt.figure(figsize=(12, 4))
@@ -1,7 +1,21 @@
 import os
+import sys
 import argparse
 
-os.environ["OMP_NUM_THREADS"] = "1"
+# peek at the seed count before numpy loads its BLAS: with several
+# workers the threadpools oversubscribe the machine, but a
+# single-seed run may as well use all cores
+nb_seeds = 1  # mirrors the argparse default below
+for i, arg in enumerate(sys.argv):
+    if arg == '--nb_seeds' and i + 1 < len(sys.argv):
+        nb_seeds = int(sys.argv[i + 1])
+    elif arg.startswith('--nb_seeds='):
+        nb_seeds = int(arg.split('=', 1)[1])
+
+if nb_seeds > 1:
+    for v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+              "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ.setdefault(v, "1")
 
 import numpy as np
 import numpy.random as npr
@@ -19,6 +33,8 @@ from mimo.distributions import CategoricalWithStickBreaking
 
 from mimo.mixtures import BayesianMixtureOfLinearGaussians
 
+from mimo.util.general import sincos
+
 import matplotlib.pyplot as plt
 from tqdm import tqdm
 
@@ -35,8 +51,11 @@ def generate_2d_kinematics(grid=(10, 10), l1=1.0, l2=1.):
 
     q1, q2 = np.meshgrid(q1, q2)
 
-    x = l1 * np.cos(q1) + l2 * np.cos(q1 + q2)
-    y = l1 * np.sin(q1) + l2 * np.sin(q1 + q2)
+    s1, c1 = sincos(q1)
+    s12, c12 = sincos(q1 + q2)
+
+    x = l1 * c1 + l2 * c12
+    y = l1 * s1 + l2 * s12
 
     return np.vstack((q1.flatten(), q2.flatten(),
                       x.flatten(), y.flatten())).T
@@ -59,9 +78,6 @@ def _job(kwargs):
     if args.affine:
         nb_params += 1
 
-    basis_prior = []
-    models_prior = []
-
     # initialize Normal
     psi_nw = 1e0
     kappa = 1e-2
@@ -70,25 +86,25 @@ def _job(kwargs):
     psi_mnw = 1e0
     K = 1e-3
 
-    for n in range(args.nb_models):
-        basis_hypparams = dict(mu=np.zeros((input_dim,)),
-                               psi=np.eye(input_dim) * psi_nw,
-                               kappa=kappa, nu=input_dim + 1)
-
-        aux = NormalWishart(**basis_hypparams)
-        basis_prior.append(aux)
+    # the hyperparameters are constant across components,
+    # build the matrices once outside the loop
+    basis_hypparams = dict(mu=np.zeros((input_dim,)),
+                           psi=np.eye(input_dim) * psi_nw,
+                           kappa=kappa, nu=input_dim + 1)
 
-        models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
-                                K=K * np.eye(nb_params), nu=target_dim + 1,
-                                psi=np.eye(target_dim) * psi_mnw)
+    models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
+                            K=K * np.eye(nb_params), nu=target_dim + 1,
+                            psi=np.eye(target_dim) * psi_mnw)
 
-        aux = MatrixNormalWishart(**models_hypparams)
-        models_prior.append(aux)
+    basis_prior = [NormalWishart(**basis_hypparams)
+                   for _ in range(args.nb_models)]
+    models_prior = [MatrixNormalWishart(**models_hypparams)
+                    for _ in range(args.nb_models)]
 
     # define gating
     if args.prior == 'stick-breaking':
-        gating_hypparams = dict(K=args.nb_models, gammas=np.ones((args.nb_models,)),
-                                deltas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, gammas=np.ones(args.nb_models),
+                                deltas=np.full(args.nb_models, args.alpha))
         gating_prior = TruncatedStickBreaking(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithStickBreaking(gating_prior),
@@ -98,7 +114,7 @@ def _job(kwargs):
                                                        for i in range(args.nb_models)])
 
     else:
-        gating_hypparams = dict(K=args.nb_models, alphas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, alphas=np.full(args.nb_models, args.alpha))
         gating_prior = Dirichlet(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithDirichlet(gating_prior),
@@ -124,10 +140,7 @@ def _job(kwargs):
                                              maxiter=args.meanfield_iters,
                                              progprint=args.verbose)
 
-        ilr.gating.prior = ilr.gating.posterior
-        for i in range(ilr.likelihood.size):
-            ilr.basis[i].prior = ilr.basis[i].posterior
-            ilr.models[i].prior = ilr.models[i].posterior
+        ilr.swap_prior_with_posterior()
 
     return ilr
 
@@ -190,11 +203,11 @@ if __name__ == "__main__":
     # predict
     mu, var, std = ilr.meanfield_prediction(input, prediction=args.prediction)
 
-    from sklearn.metrics import explained_variance_score, mean_squared_error, r2_score
+    from sklearn.metrics import explained_variance_score, mean_squared_error
 
     mse = mean_squared_error(target, mu)
     evar = explained_variance_score(target, mu, multioutput='variance_weighted')
-    smse = 1. - r2_score(target, mu, multioutput='variance_weighted')
+    smse = mse / target.var(axis=0).mean()
 
     print('EVAR:', evar, 'MSE:', mse, 'SMSE:', smse, 'Compnents:', len(ilr.used_labels))
 
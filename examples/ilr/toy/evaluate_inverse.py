@@ -1,7 +1,21 @@
 import os
+import sys
 import argparse
 
-os.environ["OMP_NUM_THREADS"] = "1"
+# peek at the seed count before numpy loads its BLAS: with several
+# workers the threadpools oversubscribe the machine, but a
+# single-seed run may as well use all cores
+nb_seeds = 1  # mirrors the argparse default below
+for i, arg in enumerate(sys.argv):
+    if arg == '--nb_seeds' and i + 1 < len(sys.argv):
+        nb_seeds = int(sys.argv[i + 1])
+    elif arg.startswith('--nb_seeds='):
+        nb_seeds = int(arg.split('=', 1)[1])
+
+if nb_seeds > 1:
+    for v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+              "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ.setdefault(v, "1")
 
 import numpy as np
 import numpy.random as npr
@@ -20,20 +34,42 @@ from mimo.distributions import CategoricalWithStickBreaking
 from mimo.mixtures import BayesianMixtureOfLinearGaussians
 
 import matplotlib.pyplot as plt
+import tikzplotlib
+
+from sklearn.metrics import explained_variance_score, mean_squared_error
+
 from tqdm import tqdm
 
-import pathos
-from pathos.pools import _ProcessPool as Pool
+import multiprocessing
+from multiprocessing import shared_memory
+
+nb_cores = multiprocessing.cpu_count()
+
+# worker-side registry of shared-memory arrays and the argument
+# namespace, populated once per process by the pool initializer
+_SHM = {}
+_ARGS = None
 
-nb_cores = pathos.multiprocessing.cpu_count()
 
+def _attach_shm(lock, descriptors, arguments):
+    global _ARGS
+    _ARGS = arguments
+    tqdm.set_lock(lock)
+    for key, (name, shape, dtype) in descriptors.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _SHM[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
 
-def _job(kwargs):
-    args = kwargs.pop('arguments')
-    seed = kwargs.pop('seed')
 
-    input = kwargs.pop('train_input')
-    target = kwargs.pop('train_target')
+def _job(seed):
+    args = _ARGS
+
+    # only the first pool worker reports progress, printing
+    # from every rank serializes the workers on stdout
+    identity = multiprocessing.current_process()._identity
+    verbose = args.verbose and (len(identity) == 0 or identity[0] == 1)
+
+    _, input = _SHM['train_input']
+    _, target = _SHM['train_target']
 
     input_dim = input.shape[-1]
     target_dim = target.shape[-1]
@@ -45,9 +81,6 @@ def _job(kwargs):
     if args.affine:
         nb_params += 1
 
-    basis_prior = []
-    models_prior = []
-
     # initialize Normal
     psi_nw = 1e1
     kappa = 1e-2
@@ -56,48 +89,48 @@ def _job(kwargs):
     psi_mnw = 1e0
     K = 1e-3
 
-    for n in range(args.nb_models):
-        basis_hypparams = dict(mu=np.zeros((input_dim,)),
-                               psi=np.eye(input_dim) * psi_nw,
-                               kappa=kappa, nu=input_dim + 1)
+    # hyperparameters are identical across components, the
+    # components only read the prior so they can share one object
+    basis_hypparams = dict(mu=np.zeros((input_dim,)),
+                           psi=np.eye(input_dim) * psi_nw,
+                           kappa=kappa, nu=input_dim + 1)
 
-        aux = NormalWishart(**basis_hypparams)
-        basis_prior.append(aux)
+    basis_prior = NormalWishart(**basis_hypparams)
 
-        models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
-                                K=K * np.eye(nb_params), nu=target_dim + 1,
-                                psi=np.eye(target_dim) * psi_mnw)
+    models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
+                            K=K * np.eye(nb_params), nu=target_dim + 1,
+                            psi=np.eye(target_dim) * psi_mnw)
 
-        aux = MatrixNormalWishart(**models_hypparams)
-        models_prior.append(aux)
+    models_prior = MatrixNormalWishart(**models_hypparams)
 
     # define gating
     if args.prior == 'stick-breaking':
-        gating_hypparams = dict(K=args.nb_models, gammas=np.ones((args.nb_models,)),
-                                deltas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, gammas=np.ones(args.nb_models),
+                                deltas=np.full(args.nb_models, args.alpha))
         gating_prior = TruncatedStickBreaking(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithStickBreaking(gating_prior),
-                                               basis=[GaussianWithNormalWishart(basis_prior[i])
+                                               basis=[GaussianWithNormalWishart(basis_prior)
                                                       for i in range(args.nb_models)],
-                                               models=[LinearGaussianWithMatrixNormalWishart(models_prior[i], affine=args.affine)
+                                               models=[LinearGaussianWithMatrixNormalWishart(models_prior, affine=args.affine)
                                                        for i in range(args.nb_models)])
 
     else:
-        gating_hypparams = dict(K=args.nb_models, alphas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, alphas=np.full(args.nb_models, args.alpha))
         gating_prior = Dirichlet(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithDirichlet(gating_prior),
-                                               basis=[GaussianWithNormalWishart(basis_prior[i])
+                                               basis=[GaussianWithNormalWishart(basis_prior)
                                                       for i in range(args.nb_models)],
-                                               models=[LinearGaussianWithMatrixNormalWishart(models_prior[i], affine=args.affine)
+                                               models=[LinearGaussianWithMatrixNormalWishart(models_prior, affine=args.affine)
                                                        for i in range(args.nb_models)])
     ilr.add_data(target, input, whiten=False,
-                 labels_from_prior=True)
+                 labels_from_prior=True,
+                 cache_stats=True)
 
     # Gibbs sampling
     ilr.resample(maxiter=args.gibbs_iters,
-                 progprint=args.verbose)
+                 progprint=verbose)
 
     for _ in range(args.super_iters):
         if args.stochastic:
@@ -109,26 +142,37 @@ def _job(kwargs):
             # Meanfield VI
             ilr.meanfield_coordinate_descent(tol=args.earlystop,
                                              maxiter=args.meanfield_iters,
-                                             progprint=args.verbose)
+                                             progprint=verbose)
 
-        ilr.gating.prior = ilr.gating.posterior
-        for i in range(ilr.likelihood.size):
-            ilr.basis[i].prior = ilr.basis[i].posterior
-            ilr.models[i].prior = ilr.models[i].posterior
+        ilr.swap_prior_with_posterior()
 
     return ilr
 
 
-def parallel_ilr_inference(nb_jobs=50, **kwargs):
-    kwargs_list = []
-    for n in range(nb_jobs):
-        kwargs['seed'] = n
-        kwargs_list.append(kwargs.copy())
+def parallel_ilr_inference(nb_jobs=50, train_input=None,
+                           train_target=None, arguments=None):
+
+    # stage the training data in shared memory once,
+    # workers attach by name instead of unpickling a copy per job
+    shms, descriptors = [], {}
+    for key, arr in [('train_input', train_input),
+                     ('train_target', train_target)]:
+        shm = shared_memory.SharedMemory(create=True, size=arr.nbytes)
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        descriptors[key] = (shm.name, arr.shape, arr.dtype)
+        shms.append(shm)
 
-    with Pool(processes=min(nb_jobs, nb_cores),
-              initializer=tqdm.set_lock,
-              initargs=(tqdm.get_lock(),)) as p:
-        res = p.map(_job, kwargs_list)
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes=min(nb_jobs, nb_cores),
+                  initializer=_attach_shm,
+                  initargs=(ctx.RLock(), descriptors, arguments)) as p:
+        # stream results as workers finish instead of
+        # holding the dispatch until the whole map returns
+        res = list(p.imap(_job, range(nb_jobs), chunksize=1))
+
+    for shm in shms:
+        shm.close()
+        shm.unlink()
 
     return res
 
@@ -173,15 +217,19 @@ if __name__ == "__main__":
                                  train_target=target,
                                  arguments=args)[0]
 
+    # compute gating weights and component moments once,
+    # mean and mode predictions share the same forward pass
+    weights = ilr.meanfield_predictive_gating(input)
+    mus, vars = ilr.meanfield_predictive_moments(input)
+
     # mean prediction
-    mu, _, _ = ilr.meanfield_prediction(input, prediction='average')
+    labels = range(ilr.likelihood.size)
+    mu, _ = ilr._mixture_moments(mus[..., labels], vars[..., labels], weights)
 
     # metrics
-    from sklearn.metrics import explained_variance_score, mean_squared_error, r2_score
-
     evar = explained_variance_score(target, mu)
     mse = mean_squared_error(target, mu)
-    smse = 1. - r2_score(target, mu)
+    smse = mse / target.var(axis=0).mean()
 
     print('MEAN - EVAR:', evar, 'MSE:', mse, 'SMSE:', smse, 'Components:', len(ilr.used_labels))
 
@@ -192,30 +240,31 @@ if __name__ == "__main__":
     axes[0].scatter(input, mu, marker='x', c='b', linewidth=0.5)
     plt.ylabel('y')
 
-    # mean prediction
-    mu, _, _ = ilr.meanfield_prediction(input, prediction='mode')
+    # mode prediction
+    k = np.argmax(weights, axis=1)
+    mu = mus[range(len(k)), ..., k]
 
     # metrics
-    from sklearn.metrics import explained_variance_score, mean_squared_error
-
     mse = mean_squared_error(target, mu)
     evar = explained_variance_score(target, mu, multioutput='variance_weighted')
-    smse = 1. - r2_score(target, mu, multioutput='variance_weighted')
+    smse = mse / target.var(axis=0).mean()
 
     print('Mode - EVAR:', evar, 'MSE:', mse, 'SMSE:', smse, 'Components:', len(ilr.used_labels))
 
     axes[0].scatter(input, mu, marker='D', facecolors='none', edgecolors='r', linewidth=0.5)
 
-    # plot gaussian activations
-    axes[1].set_xlabel('x')
-    axes[1].set_ylabel('p(x)')
+    # plot gaussian activations, the sort and the extra forward
+    # pass are pure waste when running muted
+    if args.verbose:
+        axes[1].set_xlabel('x')
+        axes[1].set_ylabel('p(x)')
 
-    sorted_input = np.sort(input, axis=0)
-    activations = ilr.meanfield_predictive_activation(sorted_input)
+        sorted_input = np.sort(input, axis=0)
+        activations = ilr.meanfield_predictive_activation(sorted_input)
 
-    colours = ['green', 'orange', 'purple']
-    for k, i in enumerate(ilr.used_labels):
-        axes[1].plot(sorted_input, activations[:, i], color=colours[k])
+        colours = ['green', 'orange', 'purple']
+        for k, i in enumerate(ilr.used_labels):
+            axes[1].plot(sorted_input, activations[:, i], color=colours[k])
 
     # set working directory
     dataset = 'inverse'
@@ -226,8 +275,6 @@ if __name__ == "__main__":
         os.chdir(args.evalpath + '/' + dataset)
 
     # save tikz and pdf
-    import tikzplotlib
-
     tikzplotlib.save(dataset + '_comparison.tex')
     plt.savefig(dataset + '_comparison.pdf')
     plt.show()
@@ -242,29 +289,11 @@ if __name__ == "__main__":
     # plot three experts
     plt.figure()
     axis = np.linspace(0, 1, 500).reshape(-1, 1)
-    mu = []
-    for t in range(len(axis)):
-        q = np.hstack((axis[t, :], 1.))
-        _mu = (regcoeff[0] @ q).tolist()
-        mu.append(_mu)
-    mu = np.asarray(mu).reshape(-1, 1)
-    plt.plot(axis, mu, linewidth=2, c='green')
-
-    mu = []
-    for t in range(len(axis)):
-        q = np.hstack((axis[t, :], 1.))
-        _mu = (regcoeff[1] @ q).tolist()
-        mu.append(_mu)
-    mu = np.asarray(mu).reshape(-1, 1)
-    plt.plot(axis, mu, linewidth=2, c='orange')
-
-    mu = []
-    for t in range(len(axis)):
-        q = np.hstack((axis[t, :], 1.))
-        _mu = (regcoeff[2] @ q).tolist()
-        mu.append(_mu)
-    mu = np.asarray(mu).reshape(-1, 1)
-    plt.plot(axis, mu, linewidth=2, c='purple')
+    axis_hom = np.hstack((axis, np.ones((len(axis), 1))))
+    mus = np.einsum('kij,tj->kti', np.stack(regcoeff[:3]), axis_hom)
+
+    for k, colour in enumerate(['green', 'orange', 'purple']):
+        plt.plot(axis, mus[k, :, 0], linewidth=2, c=colour)
 
     # plot data
     plt.scatter(input, target, facecolors='none', edgecolors='k', linewidth=0.5)
@@ -273,8 +302,6 @@ if __name__ == "__main__":
     plt.xlabel('x')
 
     # save tikz and pdf
-    import tikzplotlib
-
     tikzplotlib.save(dataset + '_experts.tex')
     plt.savefig(dataset + '_experts.pdf')
 
@@ -1,7 +1,21 @@
 import os
+import sys
 import argparse
 
-os.environ["OMP_NUM_THREADS"] = "1"
+# peek at the seed count before numpy loads its BLAS: with several
+# workers the threadpools oversubscribe the machine, but a
+# single-seed run may as well use all cores
+nb_seeds = 1  # mirrors the argparse default below
+for i, arg in enumerate(sys.argv):
+    if arg == '--nb_seeds' and i + 1 < len(sys.argv):
+        nb_seeds = int(sys.argv[i + 1])
+    elif arg.startswith('--nb_seeds='):
+        nb_seeds = int(arg.split('=', 1)[1])
+
+if nb_seeds > 1:
+    for v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+              "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ.setdefault(v, "1")
 
 import numpy as np
 import numpy.random as npr
@@ -45,9 +59,6 @@ def _job(kwargs):
     if args.affine:
         nb_params += 1
 
-    basis_prior = []
-    models_prior = []
-
     # initialize Normal
     psi_nw = 1e2
     kappa = 1e-2
@@ -56,25 +67,25 @@ def _job(kwargs):
     psi_mnw = 1e0
     K = 1e-3
 
-    for n in range(args.nb_models):
-        basis_hypparams = dict(mu=np.zeros((input_dim,)),
-                               psi=np.eye(input_dim) * psi_nw,
-                               kappa=kappa, nu=input_dim + 1)
-
-        aux = NormalWishart(**basis_hypparams)
-        basis_prior.append(aux)
+    # the hyperparameters are constant across components,
+    # build the matrices once outside the loop
+    basis_hypparams = dict(mu=np.zeros((input_dim,)),
+                           psi=np.eye(input_dim) * psi_nw,
+                           kappa=kappa, nu=input_dim + 1)
 
-        models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
-                                K=K * np.eye(nb_params), nu=target_dim + 1,
-                                psi=np.eye(target_dim) * psi_mnw)
+    models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
+                            K=K * np.eye(nb_params), nu=target_dim + 1,
+                            psi=np.eye(target_dim) * psi_mnw)
 
-        aux = MatrixNormalWishart(**models_hypparams)
-        models_prior.append(aux)
+    basis_prior = [NormalWishart(**basis_hypparams)
+                   for _ in range(args.nb_models)]
+    models_prior = [MatrixNormalWishart(**models_hypparams)
+                    for _ in range(args.nb_models)]
 
     # define gating
     if args.prior == 'stick-breaking':
-        gating_hypparams = dict(K=args.nb_models, gammas=np.ones((args.nb_models,)),
-                                deltas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, gammas=np.ones(args.nb_models),
+                                deltas=np.full(args.nb_models, args.alpha))
         gating_prior = TruncatedStickBreaking(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithStickBreaking(gating_prior),
@@ -84,7 +95,7 @@ def _job(kwargs):
                                                        for i in range(args.nb_models)])
 
     else:
-        gating_hypparams = dict(K=args.nb_models, alphas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, alphas=np.full(args.nb_models, args.alpha))
         gating_prior = Dirichlet(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithDirichlet(gating_prior),
@@ -110,10 +121,7 @@ def _job(kwargs):
                                              maxiter=args.meanfield_iters,
                                              progprint=args.verbose)
 
-        ilr.gating.prior = ilr.gating.posterior
-        for i in range(ilr.likelihood.size):
-            ilr.basis[i].prior = ilr.basis[i].posterior
-            ilr.models[i].prior = ilr.models[i].posterior
+        ilr.swap_prior_with_posterior()
 
     return ilr
 
@@ -166,19 +174,17 @@ if __name__ == "__main__":
     # create data
     nb_train = 160
 
-    input, mean = [], []
-
-    input.append(np.linspace(-2., -1, int(nb_train / 4)).reshape(int(nb_train / 4), 1))
-    input.append(np.linspace(-1., 0, int(nb_train / 4)).reshape(int(nb_train / 4), 1))
-    input.append(np.linspace(0, 1., int(nb_train / 4)).reshape(int(nb_train / 4), 1))
-    input.append(np.linspace(1, 2., int(nb_train / 4)).reshape(int(nb_train / 4), 1))
+    quarter = int(nb_train / 4)
+    input = np.empty((nb_train, 1))
+    mean = np.empty((nb_train, 1))
 
-    mean.append(np.ones((int(nb_train / 4), 1)) * 1.)
-    mean.append(np.ones((int(nb_train / 4), 1)) * 3.)
-    mean.append(np.ones((int(nb_train / 4), 1)) * 0.)
-    mean.append(np.ones((int(nb_train / 4), 1)) * 4.)
+    segments = [(-2., -1., 1.), (-1., 0., 3.),
+                (0., 1., 0.), (1., 2., 4.)]
 
-    input, mean = np.vstack(input), np.vstack(mean)
+    for i, (low, high, level) in enumerate(segments):
+        chunk = slice(i * quarter, (i + 1) * quarter)
+        input[chunk, 0] = np.linspace(low, high, quarter)
+        mean[chunk, 0] = level
     noise = 0.1 * npr.randn(nb_train).reshape(nb_train, 1)
     target = mean + noise
 
@@ -191,11 +197,11 @@ if __name__ == "__main__":
     mu, var, std = ilr.meanfield_prediction(input, prediction=args.prediction)
 
     # metrics
-    from sklearn.metrics import explained_variance_score, mean_squared_error, r2_score
+    from sklearn.metrics import explained_variance_score, mean_squared_error
 
     mse = mean_squared_error(target, mu)
     evar = explained_variance_score(target, mu, multioutput='variance_weighted')
-    smse = 1. - r2_score(target, mu, multioutput='variance_weighted')
+    smse = mse / target.var(axis=0).mean()
 
     print('EVAR:', evar, 'MSE:', mse, 'SMSE:', smse, 'Compnents:', len(ilr.used_labels))
 
@@ -1,7 +1,21 @@
 import os
+import sys
 import argparse
 
-os.environ["OMP_NUM_THREADS"] = "1"
+# peek at the seed count before numpy loads its BLAS: with several
+# workers the threadpools oversubscribe the machine, but a
+# single-seed run may as well use all cores
+nb_seeds = 1  # mirrors the argparse default below
+for i, arg in enumerate(sys.argv):
+    if arg == '--nb_seeds' and i + 1 < len(sys.argv):
+        nb_seeds = int(sys.argv[i + 1])
+    elif arg.startswith('--nb_seeds='):
+        nb_seeds = int(arg.split('=', 1)[1])
+
+if nb_seeds > 1:
+    for v in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+              "NUMEXPR_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"):
+        os.environ.setdefault(v, "1")
 
 import numpy as np
 import numpy.random as npr
@@ -22,18 +36,31 @@ from mimo.mixtures import BayesianMixtureOfLinearGaussians
 import matplotlib.pyplot as plt
 from tqdm import tqdm
 
-import pathos
-from pathos.pools import _ProcessPool as Pool
+import multiprocessing
+from multiprocessing import shared_memory
 
-nb_cores = pathos.multiprocessing.cpu_count()
+nb_cores = multiprocessing.cpu_count()
 
+# worker-side registry of shared-memory arrays and the argument
+# namespace, populated once per process by the pool initializer
+_SHM = {}
+_ARGS = None
 
-def _job(kwargs):
-    args = kwargs.pop('arguments')
-    seed = kwargs.pop('seed')
 
-    input = kwargs.pop('train_input')
-    target = kwargs.pop('train_target')
+def _attach_shm(lock, descriptors, arguments):
+    global _ARGS
+    _ARGS = arguments
+    tqdm.set_lock(lock)
+    for key, (name, shape, dtype) in descriptors.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _SHM[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _job(seed):
+    args = _ARGS
+
+    _, input = _SHM['train_input']
+    _, target = _SHM['train_target']
 
     input_dim = input.shape[-1]
     target_dim = target.shape[-1]
@@ -45,9 +72,6 @@ def _job(kwargs):
     if args.affine:
         nb_params += 1
 
-    basis_prior = []
-    models_prior = []
-
     # initialize Normal
     psi_nw = 1e-2
     kappa = 1e-2
@@ -56,25 +80,25 @@ def _job(kwargs):
     psi_mnw = 1e-2
     K = 1e-2
 
-    for n in range(args.nb_models):
-        basis_hypparams = dict(mu=np.zeros((input_dim,)),
-                               psi=np.eye(input_dim) * psi_nw,
-                               kappa=kappa, nu=input_dim + 1)
-
-        aux = NormalWishart(**basis_hypparams)
-        basis_prior.append(aux)
+    # the hyperparameters are constant across components,
+    # build the matrices once outside the loop
+    basis_hypparams = dict(mu=np.zeros((input_dim,)),
+                           psi=np.eye(input_dim) * psi_nw,
+                           kappa=kappa, nu=input_dim + 1)
 
-        models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
-                                K=K * np.eye(nb_params), nu=target_dim + 1,
-                                psi=np.eye(target_dim) * psi_mnw)
+    models_hypparams = dict(M=np.zeros((target_dim, nb_params)),
+                            K=K * np.eye(nb_params), nu=target_dim + 1,
+                            psi=np.eye(target_dim) * psi_mnw)
 
-        aux = MatrixNormalWishart(**models_hypparams)
-        models_prior.append(aux)
+    basis_prior = [NormalWishart(**basis_hypparams)
+                   for _ in range(args.nb_models)]
+    models_prior = [MatrixNormalWishart(**models_hypparams)
+                    for _ in range(args.nb_models)]
 
     # define gating
     if args.prior == 'stick-breaking':
-        gating_hypparams = dict(K=args.nb_models, gammas=np.ones((args.nb_models,)),
-                                deltas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, gammas=np.ones(args.nb_models),
+                                deltas=np.full(args.nb_models, args.alpha))
         gating_prior = TruncatedStickBreaking(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithStickBreaking(gating_prior),
@@ -84,7 +108,7 @@ def _job(kwargs):
                                                        for i in range(args.nb_models)])
 
     else:
-        gating_hypparams = dict(K=args.nb_models, alphas=np.ones((args.nb_models,)) * args.alpha)
+        gating_hypparams = dict(K=args.nb_models, alphas=np.full(args.nb_models, args.alpha))
         gating_prior = Dirichlet(**gating_hypparams)
 
         ilr = BayesianMixtureOfLinearGaussians(gating=CategoricalWithDirichlet(gating_prior),
@@ -110,24 +134,33 @@ def _job(kwargs):
                                              maxiter=args.meanfield_iters,
                                              progprint=args.verbose)
 
-        ilr.gating.prior = ilr.gating.posterior
-        for i in range(ilr.likelihood.size):
-            ilr.basis[i].prior = ilr.basis[i].posterior
-            ilr.models[i].prior = ilr.models[i].posterior
+        ilr.swap_prior_with_posterior()
 
     return ilr
 
 
-def parallel_ilr_inference(nb_jobs=50, **kwargs):
-    kwargs_list = []
-    for n in range(nb_jobs):
-        kwargs['seed'] = n
-        kwargs_list.append(kwargs.copy())
+def parallel_ilr_inference(nb_jobs=50, train_input=None,
+                           train_target=None, arguments=None):
 
-    with Pool(processes=min(nb_jobs, nb_cores),
-              initializer=tqdm.set_lock,
-              initargs=(tqdm.get_lock(),)) as p:
-        res = p.map(_job, kwargs_list)
+    # stage the training data in shared memory once,
+    # workers attach by name instead of unpickling a copy per job
+    shms, descriptors = [], {}
+    for key, arr in [('train_input', train_input),
+                     ('train_target', train_target)]:
+        shm = shared_memory.SharedMemory(create=True, size=arr.nbytes)
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        descriptors[key] = (shm.name, arr.shape, arr.dtype)
+        shms.append(shm)
+
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes=min(nb_jobs, nb_cores),
+                  initializer=_attach_shm,
+                  initargs=(ctx.RLock(), descriptors, arguments)) as p:
+        res = p.map(_job, range(nb_jobs))
+
+    for shm in shms:
+        shm.close()
+        shm.unlink()
 
     return res
 
@@ -166,17 +199,17 @@ if __name__ == "__main__":
     # create data
     nb_train = 900
 
-    input, mean = [], []
+    third = int(nb_train / 3)
+    input = np.empty((nb_train, 1))
+    mean = np.empty((nb_train, 1))
 
-    input.append(np.linspace(-3., 0, int(nb_train / 3)).reshape(int(nb_train / 3), 1))
-    input.append(np.linspace(0., 3., int(nb_train / 3)).reshape(int(nb_train / 3), 1))
-    input.append(np.linspace(3., 6., int(nb_train / 3)).reshape(int(nb_train / 3), 1))
+    segments = [(-3., 0., 0.), (0., 3., 3.), (3., 6., 6.)]
 
-    mean.append(-2 * input[0] ** 3 + 2 * input[0])
-    mean.append(-2 * (input[1] - 3) ** 3 + 2 * (input[1] - 3))
-    mean.append(-2 * (input[2] - 6) ** 3 + 2 * (input[2] - 6))
-
-    input, mean = np.vstack(input), np.vstack(mean)
+    for i, (low, high, shift) in enumerate(segments):
+        chunk = slice(i * third, (i + 1) * third)
+        input[chunk, 0] = np.linspace(low, high, third)
+        mean[chunk, 0] = - 2. * (input[chunk, 0] - shift) ** 3\
+                         + 2. * (input[chunk, 0] - shift)
     noise = 3.0 * npr.randn(nb_train).reshape(nb_train, 1)
     target = mean + noise
 
@@ -194,11 +227,11 @@ if __name__ == "__main__":
     mu, var, std = ilr.meanfield_prediction(trans_input, prediction=args.prediction)
 
     # metrics
-    from sklearn.metrics import explained_variance_score, mean_squared_error, r2_score
+    from sklearn.metrics import explained_variance_score, mean_squared_error
 
     mse = mean_squared_error(target, mu)
     evar = explained_variance_score(target, mu, multioutput='variance_weighted')
-    smse = 1. - r2_score(target, mu, multioutput='variance_weighted')
+    smse = mse / target.var(axis=0).mean()
 
     print('EVAR:', evar, 'MSE:', mse, 'SMSE:', smse, 'Compnents:', len(ilr.used_labels))
 
@@ -211,11 +244,18 @@ if __name__ == "__main__":
 
     axes[0].scatter(sorted_input, sorted_target, s=0.75, color='k')
     axes[0].plot(sorted_input, sorted_mu, color='crimson')
-    for c in [1., 2.]:
-        axes[0].fill_between(sorted_input,
-                             sorted_mu - c * sorted_std,
-                             sorted_mu + c * sorted_std,
-                             edgecolor=(0, 0, 1, 0.1), facecolor=(0, 0, 1, 0.1))
+
+    # draw all confidence bands as one collection
+    from matplotlib.collections import PolyCollection
+
+    bands = np.array([1., 2.])
+    lower = sorted_mu - bands[:, None] * sorted_std
+    upper = sorted_mu + bands[:, None] * sorted_std
+    verts = [np.vstack((np.column_stack((sorted_input, _lower)),
+                        np.column_stack((sorted_input, _upper))[::-1]))
+             for _lower, _upper in zip(lower, upper)]
+    axes[0].add_collection(PolyCollection(verts, edgecolor=(0, 0, 1, 0.1),
+                                          facecolor=(0, 0, 1, 0.1)))
 
     axes[0].set_ylabel('y')
 
@@ -13,6 +13,26 @@ class Categorical(Distribution):
         if K is not None and probs is None:
             self.probs = 1. / self.K * np.ones((self.K, ))
 
+    @property
+    def probs(self):
+        return self._probs
+
+    @probs.setter
+    def probs(self, value):
+        self._probs = value
+        self._log_probs = None
+
+    @property
+    def log_probs(self):
+        # every score evaluation needs the log-weights,
+        # compute them once per parameter update
+        if self._log_probs is None:
+            err = np.seterr(invalid='ignore', divide='ignore')
+            # log(0) can happen, no warning
+            self._log_probs = np.log(self._probs)
+            np.seterr(**err)
+        return self._log_probs
+
     @property
     def params(self):
         return self.probs
@@ -41,10 +61,7 @@ class Categorical(Distribution):
     def log_likelihood(self, x):
         bads = np.isnan(x)
         log_lik = np.zeros_like(x, dtype=np.double)
-        err = np.seterr(invalid='ignore', divide='ignore')
-        # log(0) can happen, no warning
-        log_lik[~bads] = np.log(self.probs)[list(x[~bads])]
-        np.seterr(**err)
+        log_lik[~bads] = self.log_probs[list(x[~bads])]
         return log_lik
 
     def log_partition(self):
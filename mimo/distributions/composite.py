@@ -518,7 +518,7 @@ class MatrixNormalWishart(Distribution):
         #          0.5 * logdet_lmbda]
 
         E_Lmbda_A = self.wishart.nu * self.wishart.psi @ self.matnorm.M
-        E_AT_Lmbda_A = - 0.5 * (self.drow * invpd(self.matnorm.K) + self.matnorm.M.T.dot(E_Lmbda_A))
+        E_AT_Lmbda_A = - 0.5 * (self.drow * self.matnorm.K_inv + self.matnorm.M.T.dot(E_Lmbda_A))
         E_lmbda = - 0.5 * (self.wishart.nu * self.wishart.psi)
         E_logdet_lmbda = 0.5 * (np.sum(digamma((self.wishart.nu - np.arange(self.drow)) / 2.))
                                 + self.drow * np.log(2.) + 2. * np.sum(np.log(np.diag(self.wishart.psi_chol))))
@@ -559,7 +559,7 @@ class MatrixNormalWishart(Distribution):
                + np.einsum('kh,nkh->n', nat_param[2], stats[2])\
                + nat_param[3] * stats[3]
 
-    def expected_log_likelihood(self, y, x, affine=True):
+    def expected_log_likelihood(self, y, x, affine=True, xy=None):
         E_Lmbda_A, _E_AT_Lmbda_A, _E_lmbda, _E_logdet_lmbda = self.expected_statistics()
         E_AT_Lmbda_A, E_lmbda, E_logdet_lmbda = -2. * _E_AT_Lmbda_A, -2. * _E_lmbda, 2. * _E_logdet_lmbda
 
@@ -576,7 +576,8 @@ class MatrixNormalWishart(Distribution):
         parammat = -1. / 2 * blockarray([[E_AT_Lmbda_A, - E_Lmbda_A.T],
                                          [- E_Lmbda_A,    E_lmbda]])
 
-        xy = np.hstack((x, y))
+        if xy is None:
+            xy = np.hstack((x, y))
 
         res += np.einsum('ni,ni->n', xy.dot(parammat), xy, optimize=True)
         res += - self.drow / 2. * np.log(2 * np.pi) + 1. / 2 * E_logdet_lmbda
@@ -726,8 +727,8 @@ class HierarchicalLinearGaussianWithSharedPrecision:
             matnorm_stats = np.array([
                 posterior.M @ self.matnorm.K,
                 self.matnorm.K,
-                np.trace(self.matnorm.K @ np.linalg.inv(posterior.K))
-                    * np.linalg.inv(posterior.V)
+                np.trace(self.matnorm.K @ posterior.K_inv)
+                    * posterior.V_inv
                     + posterior.M @ self.matnorm.K @ posterior.M.T,
                 x.shape[1]
             ])
@@ -736,7 +737,7 @@ class HierarchicalLinearGaussianWithSharedPrecision:
                 0.,
                 0.,
                 yyT - 2. * posterior.M @ xyT + posterior.M @ xxT @ posterior.M.T
-                    + np.trace(xxT @ np.linalg.inv(posterior.K)) * np.linalg.inv(posterior.V),
+                    + np.trace(xxT @ posterior.K_inv) * posterior.V_inv,
                 x.shape[0]
             ])
 
@@ -753,7 +754,7 @@ class HierarchicalLinearGaussianWithSharedPrecision:
 
         mus = np.einsum('kh,...h->...k', M, x)
 
-        c = 1. + np.einsum('...k,...kh,...h->...', x, np.linalg.inv(K), x)
+        c = 1. + np.einsum('...k,...kh,...h->...', x, self.matnorm.K_inv, x)
         lmbdas = np.einsum('kh,...->...kh', V, 1. / c)
 
         return mus, lmbdas
@@ -222,6 +222,8 @@ class GaussianWithPrecision(Distribution):
         self._lmbda_chol = None
         self._lmbda_chol_inv = None
 
+        self._stats_cache = None
+
     @property
     def params(self):
         return self.mu, self.lmbda
@@ -310,8 +312,30 @@ class GaussianWithPrecision(Distribution):
             stats = list(map(func, data))
             return stats if vectorize else reduce(add, stats)
 
+    def cache_statistics(self, data, cache=None):
+        # memoize the per-row outer products of a fixed dataset so that
+        # repeated weighted updates only contract against the weights
+        if cache is None:
+            idx = ~np.isnan(data).any(axis=1)
+            clean = data[idx]
+            xxT = np.einsum('nk,nh->nkh', clean, clean, optimize=True)
+            cache = (data, idx, clean, xxT)
+        self._stats_cache = cache
+        return cache
+
     def weighted_statistics(self, data, weights, vectorize=False):
         if isinstance(data, np.ndarray):
+            cache = self._stats_cache
+            if not vectorize and cache is not None and data is cache[0]:
+                _, idx, data, xxT_rows = cache
+                weights = weights[idx]
+
+                x = np.einsum('n,nk->k', weights, data, optimize=True)
+                xxT = np.einsum('n,nkh->kh', weights, xxT_rows, optimize=True)
+                n = np.sum(weights)
+
+                return Stats([x, n, xxT, n])
+
             idx = ~np.isnan(data).any(axis=1)
             data = data[idx]
             weights = weights[idx]
@@ -28,6 +28,8 @@ class LinearGaussianWithPrecision(Conditional):
         self._lmbda_chol = None
         self._lmbda_chol_inv = None
 
+        self._stats_cache = None
+
     @property
     def params(self):
         return self.A, self.lmbda
@@ -147,8 +149,40 @@ class LinearGaussianWithPrecision(Conditional):
             stats = list(map(func, y, x))
             return stats if vectorize else reduce(add, stats)
 
+    def cache_statistics(self, y, x, cache=None):
+        # memoize the per-row outer products of a fixed dataset so that
+        # repeated weighted updates only contract against the weights
+        if cache is None:
+            idx = np.logical_and(~np.isnan(y).any(axis=1),
+                                 ~np.isnan(x).any(axis=1))
+            yc, xc = y[idx], x[idx]
+
+            if self.affine:
+                xc = np.hstack((xc, np.ones((xc.shape[0], 1))))
+
+            yxT = np.einsum('nk,nh->nkh', yc, xc, optimize=True)
+            xxT = np.einsum('nk,nh->nkh', xc, xc, optimize=True)
+            yyT = np.einsum('nk,nh->nkh', yc, yc, optimize=True)
+
+            cache = (y, x, idx, yxT, xxT, yyT)
+        self._stats_cache = cache
+        return cache
+
     def weighted_statistics(self, y, x, weights, vectorize=False):
         if isinstance(y, np.ndarray) and isinstance(x, np.ndarray):
+            cache = self._stats_cache
+            if not vectorize and cache is not None\
+                    and y is cache[0] and x is cache[1]:
+                _, _, idx, yxT_rows, xxT_rows, yyT_rows = cache
+                weights = weights[idx]
+
+                yxT = np.einsum('n,nkh->kh', weights, yxT_rows, optimize=True)
+                xxT = np.einsum('n,nkh->kh', weights, xxT_rows, optimize=True)
+                yyT = np.einsum('n,nkh->kh', weights, yyT_rows, optimize=True)
+                n = np.sum(weights)
+
+                return Stats([yxT, xxT, yyT, n])
+
             idx = np.logical_and(~np.isnan(y).any(axis=1),
                                  ~np.isnan(x).any(axis=1))
             y, x, weights = y[idx], x[idx], weights[idx]
@@ -7,6 +7,8 @@ from scipy import linalg
 from mimo.abstraction import Distribution
 from mimo.abstraction import Statistics as Stats
 
+from mimo.util.matrix import invpd
+
 
 class MatrixNormalWithPrecision(Distribution):
 
@@ -18,6 +20,9 @@ class MatrixNormalWithPrecision(Distribution):
         self._V_chol = None
         self._K_chol = None
 
+        self._V_inv = None
+        self._K_inv = None
+
         self._lmbda_chol = None
         self._lmbda_chol_inv = None
 
@@ -50,6 +55,7 @@ class MatrixNormalWithPrecision(Distribution):
     def V(self, value):
         self._V = value
         self._V_chol = None
+        self._V_inv = None
 
         self._lmbda_chol = None
         self._lmbda_chol_inv = None
@@ -61,6 +67,12 @@ class MatrixNormalWithPrecision(Distribution):
             self._V_chol = sc.linalg.cholesky(self.V, lower=False)
         return self._V_chol
 
+    @property
+    def V_inv(self):
+        if self._V_inv is None:
+            self._V_inv = invpd(self.V)
+        return self._V_inv
+
     @property
     def K(self):
         return self._K
@@ -69,6 +81,7 @@ class MatrixNormalWithPrecision(Distribution):
     def K(self, value):
         self._K = value
         self._K_chol = None
+        self._K_inv = None
 
         self._lmbda_chol = None
         self._lmbda_chol_inv = None
@@ -80,6 +93,12 @@ class MatrixNormalWithPrecision(Distribution):
             self._K_chol = sc.linalg.cholesky(self.K, lower=False)
         return self._K_chol
 
+    @property
+    def K_inv(self):
+        if self._K_inv is None:
+            self._K_inv = invpd(self.K)
+        return self._K_inv
+
     @property
     def lmbda(self):
         return np.kron(self.K, self.V)
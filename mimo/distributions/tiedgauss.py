@@ -3,6 +3,9 @@ from functools import reduce, partial
 
 import numpy as np
 
+import scipy as sc
+from scipy import linalg
+
 from mimo.abstraction import Statistics as Stats
 from mimo.distributions import GaussianWithPrecision
 
@@ -13,6 +16,7 @@ class TiedGaussiansWithPrecision:
 
     def __init__(self, mus, lmbda):
         self._lmbda = lmbda
+        self._lmbda_chol = None
         self.components = [GaussianWithPrecision(mu=_mu, lmbda=lmbda)
                            for _mu in mus]
 
@@ -39,7 +43,9 @@ class TiedGaussiansWithPrecision:
 
     @property
     def mus(self):
-        return [c.mu for c in self.components]
+        # stacked (K, d) array, keeps the means contiguous
+        # for the batched scores instead of a list of views
+        return np.stack([c.mu for c in self.components])
 
     @mus.setter
     def mus(self, values):
@@ -53,9 +59,20 @@ class TiedGaussiansWithPrecision:
     @lmbda.setter
     def lmbda(self, value):
         self._lmbda = value
+        self._lmbda_chol = None
         for c in self.components:
             c.lmbda = value
 
+    @property
+    def lmbda_chol(self):
+        # factor the shared precision once and hand the result to
+        # the components so none of them refactorizes the same matrix
+        if self._lmbda_chol is None:
+            self._lmbda_chol = sc.linalg.cholesky(self.lmbda, lower=False)
+            for c in self.components:
+                c._lmbda_chol = self._lmbda_chol
+        return self._lmbda_chol
+
     def statistics(self, data, labels, vectorize=False):
         if isinstance(data, np.ndarray):
             idx = ~np.isnan(data).any(axis=1)
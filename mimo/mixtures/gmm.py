@@ -1,6 +1,6 @@
 import numpy as np
 from scipy import special as special
-from scipy.special import logsumexp
+from scipy.special import logsumexp, softmax
 
 from mimo.abstraction import MixtureDistribution
 from mimo.abstraction import BayesianMixtureDistribution
@@ -10,6 +10,7 @@ from mimo.distributions.bayesian import CategoricalWithStickBreaking
 
 from mimo.util.decorate import pass_obs_arg, pass_obs_and_labels_arg
 from mimo.util.stats import sample_discrete_from_log
+from mimo.util.stats import sample_discrete_from_log_gumbel
 from mimo.util.data import batches
 
 from sklearn.decomposition import PCA
@@ -51,13 +52,17 @@ class MixtureOfGaussians(MixtureDistribution):
         z = self.gating.rvs(size)
         counts = np.bincount(z, minlength=self.size)
 
-        obs = np.zeros((size, self.dim))
-        for idx, (c, count) in enumerate(zip(self.components, counts)):
-            obs[z == idx, ...] = c.rvs(count)
-
-        perm = np.random.permutation(size)
-        obs, z = obs[perm], z[perm]
-
+        # write contiguous segments of a label-sorted order instead
+        # of scanning a boolean mask per component
+        order = np.argsort(z, kind='stable')
+        obs = np.empty((size, self.dim))
+        start = 0
+        for c, count in zip(self.components, counts):
+            obs[order[start:start + count]] = c.rvs(count)
+            start += count
+
+        # the labels come out of the gating in iid order already,
+        # shuffling the pairs again would only copy both arrays
         return obs, z
 
     def log_likelihood(self, obs):
@@ -65,28 +70,36 @@ class MixtureOfGaussians(MixtureDistribution):
         if isinstance(obs, list):
             return [self.log_likelihood(_obs) for _obs in obs]
         else:
+            # score only the valid rows instead of masking afterwards
+            obs = obs[~np.isnan(obs).any(axis=1)]
             scores = self.log_scores(obs)
-            return logsumexp(scores[~np.isnan(obs).any(axis=1)], axis=1)
+
+            # inline logsumexp, the generic scipy routine makes
+            # extra passes this reduction does not need
+            m = np.max(scores, axis=1)
+            return m + np.log(np.sum(np.exp(scores - m[:, None]), axis=1))
 
     # Expectation-Maximization
     def log_scores(self, obs):
         N, K = obs.shape[0], self.size
 
+        # dormant components cannot win a single point,
+        # skip their likelihood evaluation entirely
+        active = np.flatnonzero(self.gating.probs > 1e-12)
+
         # update, see Eq. 10.67 in Bishop
-        component_scores = np.empty((N, K))
-        for idx, c in enumerate(self.components):
-            component_scores[:, idx] = c.log_likelihood(obs)
-        component_scores = np.nan_to_num(component_scores, copy=False)
+        component_scores = np.full((N, K), -np.inf)
+        for idx in active:
+            component_scores[:, idx] =\
+                np.nan_to_num(self.components[idx].log_likelihood(obs), copy=False)
 
-        gating_scores = self.gating.log_likelihood(np.arange(K))
+        gating_scores = self.gating.log_probs
         score = gating_scores + component_scores
         return score
 
     def scores(self, obs):
-        logr = self.log_scores(obs)
-        score = np.exp(logr - np.max(logr, axis=1, keepdims=True))
-        score /= np.sum(score, axis=1, keepdims=True)
-        return score
+        # softmax fuses the max, exp and normalization passes
+        return softmax(self.log_scores(obs), axis=1)
 
     def max_likelihood(self, obs, maxiter=1, progprint=True):
 
@@ -102,8 +115,13 @@ class MixtureOfGaussians(MixtureDistribution):
         with tqdm(total=maxiter, desc=f'EM #{pos + 1}',
                   position=pos, disable=not progprint) as pbar:
             for _ in range(maxiter):
-                # Expectation step
-                scores = [self.scores(_obs) for _obs in obs]
+                # Expectation step, scoring the concatenated
+                # trajectories once beats a python-level loop
+                if len(obs) > 1:
+                    splits = np.cumsum([len(_obs) for _obs in obs])[:-1]
+                    scores = np.split(self.scores(np.concatenate(obs)), splits)
+                else:
+                    scores = [self.scores(_obs) for _obs in obs]
 
                 # Maximization step
                 for idx, c in enumerate(self.components):
@@ -123,16 +141,17 @@ class MixtureOfGaussians(MixtureDistribution):
 
         import matplotlib.pyplot as plt
         from matplotlib import cm
+        from matplotlib.colors import to_rgba
 
         artists = []
 
-        # get colors
+        # get colors, one vectorized colormap call
+        # instead of a dict built entry by entry
         cmap = cm.get_cmap('RdBu')
         if color is None:
-            label_colors = dict((idx, cmap(v)) for idx, v in
-                                enumerate(np.linspace(0, 1, self.size, endpoint=True)))
+            label_colors = cmap(np.linspace(0, 1, self.size, endpoint=True))
         else:
-            label_colors = dict((idx, color) for idx in range(self.size))
+            label_colors = np.tile(to_rgba(color), (self.size, 1))
 
         labels = []
         for _obs in obs:
@@ -140,12 +159,14 @@ class MixtureOfGaussians(MixtureDistribution):
 
         # plot data scatter
         for _obs, _label in zip(obs, labels):
-            colorseq = [label_colors[l] for l in _label]
+            colorseq = label_colors[_label]
             artists.append(plt.scatter(_obs[:, 0], _obs[:, 1], c=colorseq, marker='+'))
 
         # plot parameters
         axis = plt.axis()
         for label, (c, w) in enumerate(zip(self.components, self.gating.probs)):
+            if w < 1e-12:
+                continue
             artists.extend(c.plot(color=label_colors[label], label='%d' % label,
                                   alpha=min(0.25, 1. - (1. - w) ** 2) / 0.25
                                   if alpha is None else alpha))
@@ -153,9 +174,9 @@ class MixtureOfGaussians(MixtureDistribution):
 
         # add legend
         if legend and color is None:
-            plt.legend([plt.Rectangle((0, 0), 1, 1, fc=c)
-                        for i, c in label_colors.items() if i in self.used_labels],
-                       [i for i in label_colors if i in self.used_labels], loc='best', ncol=2)
+            plt.legend([plt.Rectangle((0, 0), 1, 1, fc=label_colors[i])
+                        for i in self.used_labels],
+                       [i for i in self.used_labels], loc='best', ncol=2)
         plt.show()
 
         return artists
@@ -184,10 +205,11 @@ class BayesianMixtureOfGaussians(BayesianMixtureDistribution):
     @property
     def used_labels(self):
         assert self.has_data()
-        label_usages = sum(np.bincount(_label, minlength=self.likelihood.size)
-                           for _label in self.labels)
-        used_labels, = np.where(label_usages > 0)
-        return used_labels
+        # one bincount over the concatenated labels instead of a
+        # Python sum of per-trajectory count vectors
+        label_usages = np.bincount(np.concatenate(self.labels),
+                                   minlength=self.likelihood.size)
+        return np.flatnonzero(label_usages)
 
     def add_data(self, obs, whiten=False,
                  transform_type='PCA',
@@ -198,7 +220,9 @@ class BayesianMixtureOfGaussians(BayesianMixtureDistribution):
         if whiten:
             self.whitend = True
 
-            data = np.vstack([_obs for _obs in obs])
+            # concatenate writes all trajectories into one
+            # preallocated block, no intermediate list copy
+            data = np.concatenate(obs)
 
             if transform_type == 'PCA':
                 self.transform = PCA(n_components=data.shape[-1], whiten=True)
@@ -247,10 +271,13 @@ class BayesianMixtureOfGaussians(BayesianMixtureDistribution):
         with tqdm(total=maxiter, desc=f'MAP #{pos + 1}',
                   position=pos, disable=not progprint) as pbar:
             for i in range(maxiter):
-                # Expectation step
-                scores = []
-                for _obs in obs:
-                    scores.append(self.likelihood.scores(_obs))
+                # Expectation step, scoring the concatenated
+                # trajectories once beats a python-level loop
+                if len(obs) > 1:
+                    splits = np.cumsum([len(_obs) for _obs in obs])[:-1]
+                    scores = np.split(self.likelihood.scores(np.concatenate(obs)), splits)
+                else:
+                    scores = [self.likelihood.scores(_obs) for _obs in obs]
 
                 # Maximization step
                 for idx, c in enumerate(self.components):
@@ -294,21 +321,26 @@ class BayesianMixtureOfGaussians(BayesianMixtureDistribution):
         self.gating.resample([_label for _label in labels])
 
     def _resample_labels(self, obs):
-        labels = []
-        for _obs in obs:
-            score = self.likelihood.log_scores(_obs)
-            labels.append(sample_discrete_from_log(score, axis=1))
-        return labels
+        # score all trajectories in one batch and split afterwards
+        splits = np.cumsum([len(_obs) for _obs in obs])[:-1]
+        score = self.likelihood.log_scores(np.concatenate(obs))
+        return np.split(sample_discrete_from_log_gumbel(score, axis=1), splits)
 
     # Mean Field
     def expected_scores(self, obs):
         N, K = obs.shape[0], self.likelihood.size
 
+        # nans only enter through invalid input rows, patch those
+        # up front instead of scrubbing the whole score matrix
+        bads = np.isnan(obs).any(axis=1)
+        if bads.any():
+            obs = np.where(bads[:, None], 0., obs)
+
         # update, see Eq. 10.67 in Bishop
         component_scores = np.empty((N, K))
         for idx, c in enumerate(self.components):
             component_scores[:, idx] = c.posterior.expected_log_likelihood(obs)
-        component_scores = np.nan_to_num(component_scores, copy=False)
+        component_scores[bads] = 0.
 
         if isinstance(self.gating, CategoricalWithDirichlet):
             gating_scores = self.gating.posterior.expected_statistics()
@@ -320,10 +352,7 @@ class BayesianMixtureOfGaussians(BayesianMixtureDistribution):
 
         logr = gating_scores + component_scores
 
-        r = np.exp(logr - np.max(logr, axis=1, keepdims=True))
-        r /= np.sum(r, axis=1, keepdims=True)
-
-        return r
+        return softmax(logr, axis=1)
 
     def meanfield_coordinate_descent(self, tol=1e-2, maxiter=250, progprint=True):
         elbo = []
@@ -362,10 +391,10 @@ class BayesianMixtureOfGaussians(BayesianMixtureDistribution):
         return scores, z
 
     def _meanfield_update_labels(self, obs):
-        scores, labels = [], []
-        for _obs in obs:
-            scores.append(self.expected_scores(_obs))
-            labels.append(np.argmax(scores[-1], axis=1))
+        # score all trajectories in one batch and split afterwards
+        splits = np.cumsum([len(_obs) for _obs in obs])[:-1]
+        scores = np.split(self.expected_scores(np.concatenate(obs)), splits)
+        labels = [np.argmax(_score, axis=1) for _score in scores]
         return scores, labels
 
     def _meanfield_update_parameters(self, obs, scores):
@@ -382,7 +411,8 @@ class BayesianMixtureOfGaussians(BayesianMixtureDistribution):
 
     # SVI
     def meanfield_stochastic_descent(self, stepsize=1e-3, batchsize=128,
-                                     maxiter=500, progprint=True):
+                                     maxiter=500, init_batchsize=None,
+                                     progprint=True):
 
         assert self.has_data()
 
@@ -392,14 +422,34 @@ class BayesianMixtureOfGaussians(BayesianMixtureDistribution):
         else:
             pos = 0
 
-        prob = batchsize / float(sum(len(_obs) for _obs in self.obs))
+        # hoist the dataset sizes out of the descent loop
+        sizes = [len(_obs) for _obs in self.obs]
+        datasize = float(sum(sizes))
+
+        # optionally grow the minibatch linearly towards batchsize,
+        # early sweeps stay cheap while late ones average more noise
+        init_batchsize = batchsize if init_batchsize is None\
+            else min(init_batchsize, batchsize)
+
+        # reuse one minibatch buffer per dataset instead of
+        # allocating a fresh array on every gather
+        buffers = [np.empty((batchsize, _obs.shape[-1]), dtype=_obs.dtype)
+                   for _obs in self.obs]
+
+        # bind the step method once, the attribute lookup is
+        # otherwise repeated on every minibatch
+        sgdstep = self.meanfield_sgdstep
 
         with tqdm(total=maxiter, desc=f'SVI #{pos + 1}',
                   position=pos, disable=not progprint) as pbar:
-            for _ in range(maxiter):
-                for _obs in self.obs:
-                    for batch in batches(batchsize, len(_obs)):
-                        self.meanfield_sgdstep(_obs[batch, :], prob, stepsize)
+            for it in range(maxiter):
+                size = max(init_batchsize,
+                           int(batchsize * (it + 1) / maxiter))
+                prob = size / datasize
+                for _obs, _size, _mobs in zip(self.obs, sizes, buffers):
+                    for batch in batches(size, _size):
+                        np.take(_obs, batch, axis=0, out=_mobs[:size])
+                        sgdstep(_mobs[:size], prob, stepsize)
                 pbar.update(1)
 
     def meanfield_sgdstep(self, obs, prob, stepsize):
@@ -52,9 +52,9 @@ class BayesianMixtureOfMixturesOfGaussians(Distribution):
     @property
     def used_labels(self):
         assert self.has_data()
-        label_usages = sum(np.bincount(_label, minlength=self.size) for _label in self.labels)
-        used_labels, = np.where(label_usages > 0)
-        return used_labels
+        label_usages = np.bincount(np.concatenate(self.labels),
+                                   minlength=self.size)
+        return np.flatnonzero(label_usages)
 
     def add_data(self, obs, whiten=False, transform=False):
 
@@ -67,7 +67,7 @@ class BayesianMixtureOfMixturesOfGaussians(Distribution):
 
             if not transform:
                 from sklearn.decomposition import PCA
-                X = np.vstack([_obs for _obs in obs])
+                X = np.concatenate(obs)
                 self.transform = PCA(n_components=X.shape[-1], whiten=True)
                 self.transform.fit(X)
             else:
@@ -1,6 +1,6 @@
 import numpy as np
 from scipy import special as special
-from scipy.special import logsumexp
+from scipy.special import logsumexp, softmax
 
 from mimo.abstraction import ConditionalMixtureDistribution
 from mimo.abstraction import BayesianConditionalMixtureDistribution
@@ -12,6 +12,7 @@ from mimo.util.decorate import pass_target_and_input_arg
 from mimo.util.decorate import pass_target_input_and_labels_arg
 
 from mimo.util.stats import sample_discrete_from_log
+from mimo.util.stats import sample_discrete_from_log_gumbel
 from mimo.util.data import batches
 
 from sklearn.decomposition import PCA
@@ -68,15 +69,20 @@ class MixtureOfLinearGaussians(ConditionalMixtureDistribution):
         z = self.gating.likelihood.rvs(size)
         counts = np.bincount(z, minlength=self.size)
 
+        # write contiguous segments of a label-sorted order instead
+        # of scanning a boolean mask per component
+        order = np.argsort(z, kind='stable')
         x = np.empty((size, self.dcol))
         y = np.empty((size, self.drow))
-        for idx, (b, m, count) in enumerate(zip(self.basis, self.models, counts)):
-            x[z == idx, ...] = b.rvs(count)
-            y[z == idx, ...] = m.rvs(x[z == idx, ...])
-
-        perm = np.random.permutation(size)
-        x, y, z = x[perm], y[perm], z[perm]
-
+        start = 0
+        for b, m, count in zip(self.basis, self.models, counts):
+            idx = order[start:start + count]
+            x[idx] = b.rvs(count)
+            y[idx] = m.rvs(x[idx])
+            start += count
+
+        # the labels come out of the gating in iid order already,
+        # shuffling the triplets again would only copy the arrays
         return y, x, z
 
     def log_likelihood(self, y, x):
@@ -84,31 +90,39 @@ class MixtureOfLinearGaussians(ConditionalMixtureDistribution):
         if isinstance(x, list) and isinstance(y, list):
             return [self.log_likelihood(_y, _x) for (_y, _x) in zip(y, x)]
         else:
-            scores = self.log_scores(y, x)
+            # score only the valid rows instead of masking afterwards
             idx = np.logical_and(~np.isnan(y).any(axis=1),
                                  ~np.isnan(x).any(axis=1))
-            return logsumexp(scores[idx], axis=1)
+            scores = self.log_scores(y[idx], x[idx])
+
+            # inline logsumexp, the generic scipy routine makes
+            # extra passes this reduction does not need
+            m = np.max(scores, axis=1)
+            return m + np.log(np.sum(np.exp(scores - m[:, None]), axis=1))
 
     def log_scores(self, y, x):
         N, K = y.shape[0], self.size
 
-        # update, see Eq. 10.67 in Bishop
-        component_scores = np.empty((N, K))
-        for idx, (b, m) in enumerate(zip(self.basis, self.models)):
-            component_scores[:, idx] = b.log_likelihood(x)
-            component_scores[:, idx] += m.log_likelihood(y, x)
-        component_scores = np.nan_to_num(component_scores, copy=False)
+        # dormant components cannot win a single point,
+        # skip their likelihood evaluation entirely
+        active = np.flatnonzero(self.gating.probs > 1e-12)
 
-        gating_scores = self.gating.log_likelihood(np.arange(K))
+        # update, see Eq. 10.67 in Bishop
+        component_scores = np.full((N, K), -np.inf)
+        for idx in active:
+            component_scores[:, idx] = self.basis[idx].log_likelihood(x)
+            component_scores[:, idx] += self.models[idx].log_likelihood(y, x)
+            component_scores[:, idx] =\
+                np.nan_to_num(component_scores[:, idx], copy=False)
+
+        gating_scores = self.gating.log_probs
         score = gating_scores + component_scores
         return score
 
     # Expectation-Maximization
     def scores(self, y, x):
-        logr = self.log_scores(y, x)
-        score = np.exp(logr - np.max(logr, axis=1, keepdims=True))
-        score /= np.sum(score, axis=1, keepdims=True)
-        return score
+        # softmax fuses the max, exp and normalization passes
+        return softmax(self.log_scores(y, x), axis=1)
 
     def max_likelihood(self, y=None, x=None, maxiter=1, progprint=True):
 
@@ -172,16 +186,18 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
     @property
     def used_labels(self):
         assert self.has_data()
-        label_usages = sum(np.bincount(_label, minlength=self.likelihood.size)
-                           for _label in self.labels)
-        used_labels, = np.where(label_usages > 0)
-        return used_labels
+        # one bincount over the concatenated labels instead of a
+        # Python sum of per-trajectory count vectors
+        label_usages = np.bincount(np.concatenate(self.labels),
+                                   minlength=self.likelihood.size)
+        return np.flatnonzero(label_usages)
 
     def add_data(self, y, x=None, whiten=False,
                  target_transform=False,
                  input_transform=False,
                  transform_type='PCA',
-                 labels_from_prior=False):
+                 labels_from_prior=False,
+                 cache_stats=False):
 
         y = y if isinstance(y, list) else [y]
         x = x if isinstance(x, list) else [x]
@@ -191,8 +207,10 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
 
             if not (target_transform and input_transform):
 
-                Y = np.vstack([_y for _y in y])
-                X = np.vstack([_x for _x in x])
+                # concatenate writes all trajectories into one
+                # preallocated block, no intermediate list copy
+                Y = np.concatenate(y)
+                X = np.concatenate(x)
 
                 if transform_type == 'PCA':
                     self.target_transform = PCA(n_components=Y.shape[-1], whiten=True)
@@ -219,12 +237,27 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
             self.target = y
             self.input = x
 
+        if cache_stats:
+            self.cache_statistics()
+
         if labels_from_prior:
             for _y, _x in zip(self.target, self.input):
                 self.labels.append(self.likelihood.gating.rvs(len(_y)))
         else:
             self.labels = self._resample_labels(self.target, self.input)
 
+    def cache_statistics(self):
+        # the per-row sufficient statistics of the training data are the
+        # same for every component, compute them once and share them so
+        # Gibbs/VI sweeps only reweight them by the responsibilities
+        for _y, _x in zip(self.target, self.input):
+            basis_cache = self.basis[0].likelihood.cache_statistics(_x)
+            models_cache = self.models[0].likelihood.cache_statistics(_y, _x)
+            for b in self.basis[1:]:
+                b.likelihood.cache_statistics(_x, cache=basis_cache)
+            for m in self.models[1:]:
+                m.likelihood.cache_statistics(_y, _x, cache=models_cache)
+
     def clear_data(self):
         self.input.clear()
         self.target.clear()
@@ -298,33 +331,44 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
         self.gating.resample([_z for _z in z])
 
     def _resample_labels(self, y, x):
-        z = []
-        for _y, _x in zip(y, x):
-            score = self.likelihood.log_scores(_y, _x)
-            z.append(sample_discrete_from_log(score, axis=1))
-        return z
+        # score all trajectories in one batch and split afterwards
+        splits = np.cumsum([len(_y) for _y in y])[:-1]
+        score = self.likelihood.log_scores(np.concatenate(y), np.concatenate(x))
+        return np.split(sample_discrete_from_log_gumbel(score, axis=1), splits)
 
     # Mean Field
     def expected_scores(self, y, x, nb_threads=4):
         N, K = y.shape[0], self.likelihood.size
 
+        # nans only enter through invalid input rows, patch those
+        # up front instead of scrubbing the whole score matrix
+        bads = np.logical_or(np.isnan(y).any(axis=1),
+                             np.isnan(x).any(axis=1))
+        if bads.any():
+            y = np.where(bads[:, None], 0., y)
+            x = np.where(bads[:, None], 0., x)
+
         component_scores = np.empty((N, K))
 
+        # the stacked regressors are shared by all components,
+        # concatenate them once instead of once per model
+        xy = np.hstack((x, y))
+
         if nb_threads == 1:
             for idx, (b, m) in enumerate(zip(self.basis, self.models)):
                 _affine = m.likelihood.affine
                 component_scores[:, idx] = b.posterior.expected_log_likelihood(x)
-                component_scores[:, idx] += m.posterior.expected_log_likelihood(y, x, _affine)
+                component_scores[:, idx] += m.posterior.expected_log_likelihood(y, x, _affine, xy=xy)
         else:
             def _loop(idx):
                 _affine = self.models[idx].likelihood.affine
                 component_scores[:, idx] = self.basis[idx].posterior.expected_log_likelihood(x)
-                component_scores[:, idx] += self.models[idx].posterior.expected_log_likelihood(y, x, _affine)
+                component_scores[:, idx] += self.models[idx].posterior.expected_log_likelihood(y, x, _affine, xy=xy)
 
             with Pool(threads=nb_threads) as p:
                 p.map(_loop, range(self.likelihood.size))
 
-        component_scores = np.nan_to_num(component_scores, copy=False)
+        component_scores[bads] = 0.
 
         if isinstance(self.gating, CategoricalWithDirichlet):
             gating_scores = self.gating.posterior.expected_statistics()
@@ -336,10 +380,7 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
 
         logr = gating_scores + component_scores
 
-        r = np.exp(logr - np.max(logr, axis=1, keepdims=True))
-        r /= np.sum(r, axis=1, keepdims=True)
-
-        return r
+        return softmax(logr, axis=1)
 
     def meanfield_coordinate_descent(self, tol=1e-2, maxiter=250, progprint=True):
         elbo = []
@@ -378,10 +419,11 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
         return scores, z
 
     def _meanfield_update_labels(self, y, x):
-        scores, z = [], []
-        for _y, _x in zip(y, x):
-            scores.append(self.expected_scores(_y, _x))
-            z.append(np.argmax(scores[-1], axis=1))
+        # score all trajectories in one batch and split afterwards
+        splits = np.cumsum([len(_y) for _y in y])[:-1]
+        scores = np.split(self.expected_scores(np.concatenate(y),
+                                               np.concatenate(x)), splits)
+        z = [np.argmax(_score, axis=1) for _score in scores]
         return scores, z
 
     def _meanfield_update_parameters(self, y, x, scores):
@@ -407,7 +449,8 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
 
     # SVI
     def meanfield_stochastic_descent(self, stepsize=1e-3, batchsize=128,
-                                     maxiter=500, progprint=True):
+                                     maxiter=500, init_batchsize=None,
+                                     progprint=True):
 
         assert self.has_data()
 
@@ -418,15 +461,37 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
             pos = 0
 
         x, y = self.input, self.target
-        prob = batchsize / float(sum(len(_x) for _x in x))
+
+        # hoist the dataset sizes out of the descent loop
+        sizes = [len(_x) for _x in x]
+        datasize = float(sum(sizes))
+
+        # optionally grow the minibatch linearly towards batchsize,
+        # early sweeps stay cheap while late ones average more noise
+        init_batchsize = batchsize if init_batchsize is None\
+            else min(init_batchsize, batchsize)
+
+        # reuse one pair of minibatch buffers per dataset instead
+        # of allocating fresh arrays on every gather
+        buffers = [(np.empty((batchsize, _x.shape[-1]), dtype=_x.dtype),
+                    np.empty((batchsize, _y.shape[-1]), dtype=_y.dtype))
+                   for _x, _y in zip(x, y)]
+
+        # bind the step method once, the attribute lookup is
+        # otherwise repeated on every minibatch
+        sgdstep = self.meanfield_sgdstep
 
         with tqdm(total=maxiter, desc=f'SVI #{pos + 1}',
                   position=pos, disable=not progprint) as pbar:
-            for _ in range(maxiter):
-                for _x, _y in zip(x, y):
-                    for batch in batches(batchsize, len(_x)):
-                        _mx, _my = _x[batch, :], _y[batch, :]
-                        self.meanfield_sgdstep(_my, _mx, prob, stepsize)
+            for it in range(maxiter):
+                size = max(init_batchsize,
+                           int(batchsize * (it + 1) / maxiter))
+                prob = size / datasize
+                for _x, _y, _size, (_mx, _my) in zip(x, y, sizes, buffers):
+                    for batch in batches(size, _size):
+                        np.take(_x, batch, axis=0, out=_mx[:size])
+                        np.take(_y, batch, axis=0, out=_my[:size])
+                        sgdstep(_my[:size], _mx[:size], prob, stepsize)
                 pbar.update(1)
 
     def meanfield_sgdstep(self, y, x, prob, stepsize):
@@ -462,6 +527,14 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
     def _meanfield_sgdstep_gating(self, scores, prob, stepsize):
         self.gating.meanfield_sgdstep(None, scores, prob, stepsize)
 
+    def swap_prior_with_posterior(self):
+        # warm-start the next round of inference by adopting
+        # the posterior objects as priors, no copies are made
+        self.gating.prior = self.gating.posterior
+        for b, m in zip(self.basis, self.models):
+            b.prior = b.posterior
+            m.prior = m.posterior
+
     def _variational_lowerbound_labels(self, scores):
         vlb = 0.
 
@@ -645,18 +718,19 @@ class BayesianMixtureOfLinearGaussians(BayesianConditionalMixtureDistribution):
         if incremental:
             mu += x[:, :self.likelihood.drow]
 
-        diag = np.vstack(list(map(np.diag, var)))
+        diag = np.diagonal(var, axis1=-2, axis2=-1)
+        std = np.sqrt(diag)
 
         if compute_nlpd:
             if variance == 'diagonal':
-                return mu, diag, np.sqrt(diag), nlpd
+                return mu, diag, std, nlpd
             else:
-                return mu, var, np.sqrt(diag), nlpd
+                return mu, var, std, nlpd
         else:
             if variance == 'diagonal':
-                return mu, diag, np.sqrt(diag)
+                return mu, diag, std
             else:
-                return mu, var, np.sqrt(diag)
+                return mu, var, std
 
 
 class CompressedMixtureOfLinearGaussians:
@@ -1,5 +1,6 @@
 import numpy as np
 from scipy import special as special
+from scipy.special import softmax
 
 from mimo.mixtures.gmm import MixtureOfGaussians
 from mimo.abstraction import BayesianMixtureDistribution
@@ -8,7 +9,7 @@ from mimo.distributions.bayesian import CategoricalWithDirichlet
 from mimo.distributions.bayesian import CategoricalWithStickBreaking
 
 from mimo.util.decorate import pass_obs_arg, pass_obs_and_labels_arg
-from mimo.util.stats import sample_discrete_from_log
+from mimo.util.stats import sample_discrete_from_log_gumbel
 
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
@@ -16,6 +17,10 @@ from sklearn.preprocessing import StandardScaler, MinMaxScaler
 from tqdm import tqdm
 from pathos.helpers import mp
 
+import pathos
+from pathos.pools import ThreadPool as Pool
+nb_cores = pathos.multiprocessing.cpu_count()
+
 
 class MixtureOfTiedGaussians(MixtureOfGaussians):
     """
@@ -40,6 +45,38 @@ class MixtureOfTiedGaussians(MixtureOfGaussians):
     def mus(self):
         return self.ensemble.mus
 
+    def log_scores(self, obs):
+        K = self.size
+
+        # all components share the precision matrix, so one batched
+        # Mahalanobis evaluation replaces the per-component loop
+        obs = np.atleast_2d(obs).reshape((-1, self.dim))
+
+        # patch invalid rows on a copy, the caller's data keeps its nans
+        bads = np.isnan(obs).any(axis=1)
+        if bads.any():
+            obs = np.where(bads[:, None], 0., obs)
+
+        # dormant components cannot win a single point,
+        # restrict the Mahalanobis batch to the live ones
+        active = np.flatnonzero(self.gating.probs > 1e-12)
+        mus = self.mus[active]
+
+        # whitening with the cached cholesky factor turns the
+        # three-operand contraction into one gemm plus a square-sum
+        diff = obs[:, None, :] - mus[None, :, :]
+        white = diff @ self.ensemble.lmbda_chol.T
+        maha = np.einsum('nke,nke->nk', white, white)
+
+        log_norm = np.sum(np.log(np.diag(self.ensemble.lmbda_chol)))\
+            - 0.5 * self.dim * np.log(2. * np.pi)
+
+        gating_scores = self.gating.log_probs
+
+        scores = np.full((len(obs), K), -np.inf)
+        scores[:, active] = gating_scores[active] + log_norm - 0.5 * maha
+        return scores
+
     def max_likelihood(self, obs, maxiter=1, progprint=True):
 
         current = mp.current_process()
@@ -54,8 +91,13 @@ class MixtureOfTiedGaussians(MixtureOfGaussians):
         with tqdm(total=maxiter, desc=f'EM #{pos + 1}',
                   position=pos, disable=not progprint) as pbar:
             for _ in range(maxiter):
-                # Expectation step
-                scores = [self.scores(_obs) for _obs in obs]
+                # Expectation step, the trajectories are
+                # independent and can be scored concurrently
+                if len(obs) > 1:
+                    with Pool(threads=min(len(obs), nb_cores)) as p:
+                        scores = p.map(self.scores, obs)
+                else:
+                    scores = [self.scores(_obs) for _obs in obs]
 
                 # Maximization step
                 self.ensemble.max_likelihood(obs, scores)
@@ -90,10 +132,11 @@ class BayesianMixtureOfTiedGaussians(BayesianMixtureDistribution):
     @property
     def used_labels(self):
         assert self.has_data()
-        label_usages = sum(np.bincount(_label, minlength=self.likelihood.size)
-                           for _label in self.labels)
-        used_labels, = np.where(label_usages > 0)
-        return used_labels
+        # one bincount over the concatenated labels instead of a
+        # Python sum of per-trajectory count vectors
+        label_usages = np.bincount(np.concatenate(self.labels),
+                                   minlength=self.likelihood.size)
+        return np.flatnonzero(label_usages)
 
     def add_data(self, obs, whiten=False,
                  transform_type='PCA',
@@ -104,7 +147,9 @@ class BayesianMixtureOfTiedGaussians(BayesianMixtureDistribution):
         if whiten:
             self.whitend = True
 
-            data = np.vstack([_obs for _obs in obs])
+            # concatenate writes all trajectories into one
+            # preallocated block, no intermediate list copy
+            data = np.concatenate(obs)
 
             if transform_type == 'PCA':
                 self.transform = PCA(n_components=data.shape[-1], whiten=True)
@@ -153,8 +198,13 @@ class BayesianMixtureOfTiedGaussians(BayesianMixtureDistribution):
         with tqdm(total=maxiter, desc=f'MAP #{pos + 1}',
                   position=pos, disable=not progprint) as pbar:
             for i in range(maxiter):
-                # Expectation step
-                scores = [self.likelihood.scores(_obs) for _obs in obs]
+                # Expectation step, the trajectories are
+                # independent and can be scored concurrently
+                if len(obs) > 1:
+                    with Pool(threads=min(len(obs), nb_cores)) as p:
+                        scores = p.map(self.likelihood.scores, obs)
+                else:
+                    scores = [self.likelihood.scores(_obs) for _obs in obs]
 
                 # Maximization step
                 self.ensemble.max_aposteriori(obs, scores)
@@ -192,16 +242,25 @@ class BayesianMixtureOfTiedGaussians(BayesianMixtureDistribution):
         self.gating.resample([_label for _label in labels])
 
     def _resample_labels(self, obs):
-        labels = []
-        for _obs in obs:
+        def _sample(_obs):
             score = self.likelihood.log_scores(_obs)
-            labels.append(sample_discrete_from_log(score, axis=1))
-        return labels
+            return sample_discrete_from_log_gumbel(score, axis=1)
+
+        if len(obs) > 1:
+            with Pool(threads=min(len(obs), nb_cores)) as p:
+                return p.map(_sample, obs)
+        return [_sample(_obs) for _obs in obs]
 
     # Mean Field
     def expected_scores(self, obs):
+        # nans only enter through invalid input rows, patch those
+        # up front instead of scrubbing the whole score matrix
+        bads = np.isnan(obs).any(axis=1)
+        if bads.any():
+            obs = np.where(bads[:, None], 0., obs)
+
         component_scores = self.ensemble.posterior.expected_log_likelihood(obs)
-        component_scores = np.nan_to_num(component_scores, copy=False)
+        component_scores[bads] = 0.
 
         if isinstance(self.gating, CategoricalWithDirichlet):
             gating_scores = self.gating.posterior.expected_statistics()
@@ -213,10 +272,7 @@ class BayesianMixtureOfTiedGaussians(BayesianMixtureDistribution):
 
         logr = gating_scores + component_scores
 
-        r = np.exp(logr - np.max(logr, axis=1, keepdims=True))
-        r /= np.sum(r, axis=1, keepdims=True)
-
-        return r
+        return softmax(logr, axis=1)
 
     def meanfield_coordinate_descent(self, tol=1e-2, maxiter=250, progprint=True):
         elbo = []
@@ -255,10 +311,12 @@ class BayesianMixtureOfTiedGaussians(BayesianMixtureDistribution):
         return scores, z
 
     def _meanfield_update_labels(self, obs):
-        scores, labels = [], []
-        for _obs in obs:
-            scores.append(self.expected_scores(_obs))
-            labels.append(np.argmax(scores[-1], axis=1))
+        if len(obs) > 1:
+            with Pool(threads=min(len(obs), nb_cores)) as p:
+                scores = p.map(self.expected_scores, obs)
+        else:
+            scores = [self.expected_scores(_obs) for _obs in obs]
+        labels = [np.argmax(_score, axis=1) for _score in scores]
         return scores, labels
 
     def _meanfield_update_parameters(self, obs, scores):
@@ -2,6 +2,13 @@ import numpy as np
 import numpy.random as npr
 
 
+def sincos(x):
+    # a single complex exponential shares the range
+    # reduction between both trigonometric evaluations
+    z = np.exp(1j * np.asarray(x))
+    return z.imag, z.real
+
+
 # env
 def sample_env(env, nb_rollouts, nb_steps,
                ctl=None, noise_std=0.1,
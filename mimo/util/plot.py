@@ -4,6 +4,11 @@ import os
 from matplotlib import pyplot as plt
 import tikzplotlib
 
+# unit circle reused by plot_gaussian, the trig
+# evaluations are identical for every ellipse
+_t = np.hstack([np.arange(0, 2 * np.pi, 0.01), 0])
+_circle = np.vstack([np.sin(_t), np.cos(_t)])
+
 
 def beautify(ax):
     ax.set_frame_on(True)
@@ -33,9 +38,7 @@ def beautify(ax):
 def plot_gaussian(mu, lmbda, color='r', label='', alpha=1.0, ax=None, artists=None):
     ax = ax if ax else plt.gca()
 
-    t = np.hstack([np.arange(0, 2 * np.pi, 0.01), 0])
-    circle = np.vstack([np.sin(t), np.cos(t)])
-    ellipse = np.dot(np.linalg.cholesky(lmbda), circle)
+    ellipse = np.dot(np.linalg.cholesky(lmbda), _circle)
 
     if artists is None:
         point = ax.scatter([mu[0]], [mu[1]], marker='D', color=color, s=4,
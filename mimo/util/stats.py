@@ -2,11 +2,18 @@ import numpy as np
 from numpy import random as npr
 
 import scipy as sc
-from scipy.special import logsumexp
+from scipy.special import logsumexp, softmax
 
 
 def sample_discrete_from_log(p_log, return_lognorms=False, axis=0, dtype=np.int32):
     # samples log probability array along specified axis
+    if p_log.ndim == 2 and axis == 1 and not return_lognorms:
+        # row-wise fast path, softmax fuses the normalization and
+        # one uniform per row inverts the cdf without any reshaping
+        cdf = softmax(p_log, axis=1).cumsum(axis=1)
+        randvals = npr.random(size=(len(p_log), 1)) * cdf[:, -1:]
+        return np.sum(randvals > cdf, axis=1, dtype=dtype)
+
     lognorms = logsumexp(p_log, axis=axis)
     cumvals = np.exp(p_log - np.expand_dims(lognorms, axis)).cumsum(axis)
     thesize = np.array(p_log.shape)
@@ -21,6 +28,13 @@ def sample_discrete_from_log(p_log, return_lognorms=False, axis=0, dtype=np.int3
         return samples
 
 
+def sample_discrete_from_log_gumbel(p_log, axis=0, dtype=np.int32):
+    # gumbel-max trick, samples the categorical without
+    # normalization, exponentiation or a cumulative scan
+    gumbels = npr.gumbel(size=p_log.shape)
+    return np.argmax(p_log + gumbels, axis=axis).astype(dtype)
+
+
 def multivariate_gaussian_loglik(xs, mu, lmbda, logdet_lmbda=None):
     # Accepts vectorized parameters
     d = mu.shape[-1]